@@ -1,30 +1,140 @@
+import os
 import re
 import threading
+import time
 from datetime import datetime
 import json
-from flask import Flask, render_template, make_response
-from flask_socketio import SocketIO, emit
+import uuid
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, make_response, request, session
+from flask_socketio import SocketIO, emit, join_room
 import assemblyai as aai
 from constant import assemblyai_api_key  # Your AssemblyAI API key
-from pyppeteer import launch
+from pipeline import Stage, run_stages, timing_hooks
+from lemur_cache import LemurCache, cache_key
+from segments import Segment
+from entities import EntityIndex
+from scheduler import AnalysisScheduler
+from audio_ingest import AudioStream
+from replay import SessionRecorder
+from metrics import Counter, Gauge, Histogram, Tracer, registry
+from vocabulary import MedicalVocabulary
+from clinics import ClinicDirectory
+from pdf_renderer import ChromiumRenderer, PdfCache, WkhtmltopdfRenderer
+from sessions import MemoryBackend, RedisBackend, SessionStore
 
 app = Flask(__name__)
-socketio = SocketIO(app)
+# With REDIS_URL set, consultation state and socket.io events are shared
+# between worker processes; otherwise everything stays in this process.
+redis_url = os.environ.get("REDIS_URL")
+# The secret key must be shared by all workers so they agree on session
+# cookies; a per-worker random key would silently start a new consultation
+# whenever a request lands on another worker.
+if redis_url and not os.environ.get("SECRET_KEY"):
+    raise RuntimeError("SECRET_KEY must be set when REDIS_URL is set")
+app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(24)
+socketio = SocketIO(app, message_queue=redis_url)
 aai.settings.api_key = assemblyai_api_key
 
-transcriber = None
-session_id = None
-transcriber_lock = threading.Lock()
-# On re-analysis, previous analysis is replaced.
-report_transcript = ""
-current_language = "english"  # default language for realtime transcription
+# LeMUR responses are cached by (prompt, input, model). Set LEMUR_CACHE_PATH to
+# a sqlite file to keep them across restarts. Clinic suggestions depend on the
+# user's location and expire sooner.
+lemur_cache = LemurCache(path=os.environ.get("LEMUR_CACHE_PATH"))
+CLINIC_CACHE_TTL = 15 * 60
+# A re-analysis formats edited runs of sentences separately up to this many
+# runs, and re-formats the whole transcript beyond that.
+MAX_REFORMAT_RUNS = int(os.environ.get("MAX_REFORMAT_RUNS", 3))
+
+# With CLINIC_DIRECTORY_PATH set to a CSV or JSON clinic directory, clinic
+# suggestions are nearest-neighbour lookups in it, cached per geohash cell
+# and specialty. Without one, LeMUR is asked as before.
+clinic_directory = ClinicDirectory.load(os.environ["CLINIC_DIRECTORY_PATH"]) if os.environ.get("CLINIC_DIRECTORY_PATH") else None
+
+# Set SESSION_RECORDING to a .jsonl path to record final transcripts and LeMUR
+# round trips for offline replay with bench_replay.py.
+session_recorder = SessionRecorder(os.environ["SESSION_RECORDING"]) if os.environ.get("SESSION_RECORDING") else None
+
+# Instrumentation is cheap enough to leave on; /metrics serves it in the
+# Prometheus text format, per worker process. Set METRICS_LOG to a path (or
+# "-" for stdout) to also get a JSON line per traced step, tagged with the
+# trace id of the utterance it belongs to.
+tracer = Tracer(os.environ.get("METRICS_LOG"))
+lemur_requests = Counter("lemur_requests_total", "LeMUR tasks sent to the API, i.e. cache misses.", labels=("task",))
+lemur_failures = Counter("lemur_failures_total", "LeMUR tasks that raised.", labels=("task",))
+lemur_seconds = Histogram("lemur_request_seconds", "LeMUR API round trip time.", labels=("task",))
+json_fallbacks = Counter("lemur_json_fallbacks_total", "LeMUR answers that were not valid JSON and fell back to a default.", labels=("task",))
+utterance_latency = Histogram("utterance_to_event_seconds", "Time from a final transcript arriving to each socket event sent for it.", labels=("event",))
+stage_outcomes = Counter("pipeline_stage_outcomes_total", "Analysis stages finished, by status.", labels=("stage", "status"))
+realtime_transcripts = Counter("realtime_transcripts_total", "Transcripts received from the realtime transcriber.", labels=("kind",))
+realtime_events = Counter("realtime_session_events_total", "Realtime transcriber session opens, closes and errors.", labels=("event",))
+correction_sources = Counter("correction_suggestions_total", "Correction suggestion requests, by where the answer came from.", labels=("source",))
+
+def count_stage(name, seconds, status):
+    # format_0, format_1, ... are one stage as far as metrics are concerned.
+    stage_outcomes.inc(stage=re.sub(r'_\d+$', '', name), status=status)
+
+timing_hooks.append(count_stage)
+
+def scheduler_counts():
+    stats = analysis_scheduler.stats()
+    return {(outcome,): stats[outcome] for outcome in ("submitted", "merged", "dropped", "processed", "failed")}
+
+def lemur_cache_counts():
+    stats = lemur_cache.stats()
+    return {(result,): stats[key] for result, key in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses"), ("coalesced", "coalesced"))}
 
-# Global variables for chart data
-symptom_counts = {}      
-severity_trends = []     
-symptom_timeline = []    
+def clinic_directory_counts():
+    stats = clinic_directory.stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"]}
 
-user_location = None  # Store user's location
+Gauge("realtime_sessions_active", "Realtime transcribers open in this worker.", function=lambda: len(transcribers))
+Gauge("audio_streams_active", "Browser audio streams open in this worker.", function=lambda: len(audio_streams))
+Gauge("analysis_queue_depth", "Analysis jobs waiting for a worker.", function=lambda: analysis_scheduler.stats()["queue_depth"])
+Gauge("analysis_jobs_running", "Analysis jobs being processed.", function=lambda: analysis_scheduler.stats()["running"])
+Counter("analysis_utterances_total", "Utterances handled by the analysis scheduler, by outcome.", labels=("outcome",), function=scheduler_counts)
+Counter("lemur_cache_lookups_total", "LeMUR cache lookups, by result.", labels=("result",), function=lemur_cache_counts)
+if clinic_directory is not None:
+    Counter("clinic_directory_lookups_total", "Clinic directory lookups, by cache result.", labels=("result",), function=clinic_directory_counts)
+
+# Correction suggestions come from a local phonetic index of medical terms;
+# LeMUR is only asked when the best local match scores below
+# SUGGESTION_CONFIDENCE. Corrections the clinician accepts are learned, and
+# kept in LEARNED_TERMS_PATH across restarts if it is set.
+medical_vocabulary = MedicalVocabulary(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "medical_terms.csv"),
+    learned_path=os.environ.get("LEARNED_TERMS_PATH")
+)
+SUGGESTION_CONFIDENCE = float(os.environ.get("SUGGESTION_CONFIDENCE", 0.6))
+# Suggestions sent to a socket are remembered (the newest few) so that only
+# those can be accepted into the shared vocabulary.
+MAX_OFFERED_SUGGESTIONS = 30
+
+# Consultation state (report, chart data, location, language) is keyed by a
+# consultation id kept in the Flask session cookie, which is also the
+# socket.io room that the consultation's events are sent to.
+consultations = SessionStore(RedisBackend(url=redis_url) if redis_url else MemoryBackend())
+
+# PDFs are rendered from in-memory report HTML by a long-lived Chromium, or by
+# wkhtmltopdf with PDF_BACKEND=wkhtmltopdf, and cached by report content.
+if os.environ.get("PDF_BACKEND") == "wkhtmltopdf":
+    pdf_renderer = WkhtmltopdfRenderer(os.environ.get("WKHTMLTOPDF_PATH"))
+else:
+    pdf_renderer = ChromiumRenderer(os.environ.get("CHROME_PATH", r"C:\Program Files\Google\Chrome\Application\chrome.exe"))
+pdf_cache = PdfCache(pdf_renderer)
+
+# Realtime transcribers live in the worker that owns the consultation's socket.
+transcribers = {}  # consultation id -> {"transcriber": ..., "session_id": ...}
+transcriber_lock = threading.Lock()
+
+# Browser audio: PCM chunks arrive as binary socket.io frames and are
+# resampled to 16 kHz mono before being streamed to the transcriber.
+# Only the socket that sent audio_start may feed or stop its stream; other
+# sockets of the same consultation (a report tab, a stale reconnect) come and go.
+audio_streams = {}  # consultation id -> {"stream": AudioStream, "sid": owning socket id}
+AUDIO_SEND_MS = int(os.environ.get("AUDIO_SEND_MS", 100))
+AUDIO_BUFFER_MS = int(os.environ.get("AUDIO_BUFFER_MS", 5000))
+AUDIO_MAX_CHUNK_BYTES = int(os.environ.get("AUDIO_MAX_CHUNK_BYTES", 64 * 1024))
 
 base_prompt = '''You are a medical transcript analyzer. Your task is to return the exact transcript with the following modifications:
 1. Wrap any Protected Health Information (PHI) (such as names, ages, nationalities, gender identities, organizations) in <span style="color: red;"> ... </span>.
@@ -36,6 +146,12 @@ base_prompt = '''You are a medical transcript analyzer. Your task is to return t
 If there is insufficient information to predict a diagnosis or apply modifications, simply return the transcript verbatim.
 Return only the formatted transcript without any additional commentary.'''
 
+# Used when a re-analysis only re-formats the edited runs of sentences: their
+# diagnosis lines each see part of the transcript, so the diagnosis is asked
+# for the whole updated transcript instead.
+diagnosis_prompt = '''You are a medical transcript analyzer. Based solely on the transcript below, predict the most likely diagnosis.
+Return only the name of the diagnosis with no extra text, or NONE if there is insufficient information to predict one.'''
+
 precautions_prompt = '''You are a medical advisor. Based on the predicted diagnosis provided below, suggest practical precautions (including recommended food items and home remedies).
 Format your answer in HTML as follows:
 <div class="precautions">
@@ -55,47 +171,156 @@ or
 <span class="severity">Severity: LOW - Maintain healthy habits.</span>
 Return only the HTML formatted text.'''
 
-def on_open(session_opened: aai.RealtimeSessionOpened):
-    global session_id
-    session_id = session_opened.session_id
-    print("Session ID:", session_id)
+def emit_traced(trace, event, payload):
+    with tracer.span(trace, "emit", socket_event=event):
+        socketio.emit(event, payload, to=trace.consultation_id)
+    utterance_latency.observe(trace.elapsed(), event=event)
 
-def on_data(transcript: aai.RealtimeTranscript):
+def on_open(consultation_id, session_opened: aai.RealtimeSessionOpened):
+    with transcriber_lock:
+        if consultation_id in transcribers:
+            transcribers[consultation_id]["session_id"] = session_opened.session_id
+    realtime_events.inc(event="open")
+    tracer.event(None, "realtime_open", consultation=consultation_id, session_id=session_opened.session_id)
+    print("Session ID:", session_opened.session_id)
+
+def on_data(consultation_id, transcript: aai.RealtimeTranscript):
     if not transcript.text:
         return
     # For final transcripts, trigger analysis.
     if isinstance(transcript, aai.RealtimeFinalTranscript):
-        socketio.emit('transcript', {'text': transcript.text})
-        analyze_transcript(transcript.text, reanalysis=False)
+        realtime_transcripts.inc(kind="final")
+        trace = tracer.start(consultation_id)
+        if session_recorder:
+            session_recorder.transcript(consultation_id, transcript.text)
+        emit_traced(trace, 'transcript', {'text': transcript.text})
+        analysis_scheduler.submit(consultation_id, transcript.text, trace=trace)
     else:
-        socketio.emit('partial_transcript', {'text': transcript.text})
+        realtime_transcripts.inc(kind="partial")
+        socketio.emit('partial_transcript', {'text': transcript.text}, to=consultation_id)
 
-def on_error(error: aai.RealtimeError):
+def on_error(consultation_id, error: aai.RealtimeError):
+    # An error before the session opened means connect() failed; forget the
+    # transcriber so callers can tell.
+    with transcriber_lock:
+        live = transcribers.get(consultation_id)
+        if live and live["session_id"] is None:
+            del transcribers[consultation_id]
+    realtime_events.inc(event="error")
+    tracer.event(None, "realtime_error", consultation=consultation_id, error=str(error))
     print("An error occurred:", error)
 
-def on_close():
-    global session_id
-    session_id = None
+def on_close(consultation_id):
+    with transcriber_lock:
+        transcribers.pop(consultation_id, None)
+    realtime_events.inc(event="close")
+    tracer.event(None, "realtime_close", consultation=consultation_id)
     print("Closing Session")
 
-def transcribe_real_time(language):
-    global transcriber, current_language
-    current_language = language.lower() if language else "english"
-    transcriber = aai.RealtimeTranscriber(
+def assemblyai_transcriber(consultation_id):
+    return aai.RealtimeTranscriber(
         sample_rate=16_000,
-        on_data=on_data,
-        on_error=on_error,
-        on_open=on_open,
-        on_close=on_close
+        on_data=partial(on_data, consultation_id),
+        on_error=partial(on_error, consultation_id),
+        on_open=partial(on_open, consultation_id),
+        on_close=partial(on_close, consultation_id)
     )
+
+# Builds the realtime transcriber for a consultation; swapped for
+# audio_ingest.ReplayTranscriber in benchmarks.
+transcriber_factory = assemblyai_transcriber
+
+def transcribe_real_time(consultation_id, language):
+    with consultations.edit(consultation_id) as consultation:
+        consultation.current_language = language.lower() if language else "english"
+    transcriber = transcriber_factory(consultation_id)
+    with transcriber_lock:
+        transcribers[consultation_id] = {"transcriber": transcriber, "session_id": None}
     transcriber.connect()
     microphone_stream = aai.extras.MicrophoneStream(sample_rate=16_000)
     transcriber.stream(microphone_stream)
 
-def analyze_transcript(transcript, reanalysis=False):
-    global report_transcript, symptom_counts, severity_trends, symptom_timeline, current_language
+def lemur_task(prompt, input_text, ttl=None, task="other"):
+    # Every LeMUR call goes through the response cache; ttl=0 skips it.
+    # task only labels the metrics.
+    model = aai.LemurModel.claude3_5_sonnet
+    def _task():
+        lemur_requests.inc(task=task)
+        started = time.monotonic()
+        try:
+            result = aai.Lemur().task(
+                prompt,
+                input_text=input_text,
+                final_model=model
+            )
+        except Exception:
+            lemur_failures.inc(task=task)
+            raise
+        seconds = time.monotonic() - started
+        lemur_seconds.observe(seconds, task=task)
+        if session_recorder:
+            session_recorder.lemur(prompt, input_text, model, result.response, seconds)
+        return result.response.strip()
+    return lemur_cache.get_or_compute(cache_key(prompt, input_text, model), _task, ttl=ttl)
+
+def clinic_prompt_for(location):
+    if location:
+        loc_str = f"latitude {location['latitude']}, longitude {location['longitude']}"
+    else:
+        loc_str = "a generic urban area"
+    return f'''You are a healthcare advisor. The patient is located at {loc_str}. Based on the predicted diagnosis provided below, suggest a list of nearby clinics and hospitals that specialize in this condition.
+Format your answer in HTML as an unordered list (<ul>...</ul>).
+For each suggestion, include:
+- The Clinic/Hospital Name
+- The Address
+- The Contact Information
+- A "Get Directions" button that is an anchor tag (<a>) opening Google Maps in a new tab.
+Format the "Get Directions" link so that the href is: "https://www.google.com/maps/search/?api=1&query=CLINIC_ADDRESS"
+Do not include any extra commentary.'''
+
+def analyze_transcript(consultation_id, transcript, reanalysis=False, traces=None):
+    # Utterances merged into one job are reported against the oldest one.
+    traces = traces or [tracer.start(consultation_id)]
+    trace = traces[0]
+    for queued in traces:
+        tracer.record(queued, "queue", queued.elapsed(), merged_into=trace.id)
+    # Analyses of one consultation run one at a time, without holding up
+    # location and language edits while LeMUR answers.
+    with consultations.analysis(consultation_id) as consultation:
+        chart_version = consultation.charts.version
+        with tracer.span(trace, "analysis", reanalysis=reanalysis):
+            analyze_consultation(consultation, transcript, reanalysis, trace)
+    # Push only what changed so open dashboards do not have to poll.
+    if consultation.charts.version != chart_version:
+        emit_traced(trace, 'chart_update', consultation.charts.delta(chart_version))
+
+# Final transcripts are analyzed off the realtime callback thread. Utterances
+# that arrive while a consultation's previous job is still queued are merged.
+# Stages of all analyses share one pool, with room for about four concurrent
+# LeMUR stages per scheduler worker plus one re-analysis request.
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", 2))
+stage_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("STAGE_WORKERS", 4 * (ANALYSIS_WORKERS + 1))),
+    thread_name_prefix="stage"
+)
+analysis_scheduler = AnalysisScheduler(
+    analyze_transcript,
+    workers=ANALYSIS_WORKERS,
+    max_queue=int(os.environ.get("ANALYSIS_QUEUE_SIZE", 32)),
+    max_latency=float(os.environ.get("ANALYSIS_MAX_LATENCY", 2.0))
+)
+
+def same_diagnosis(a, b):
+    # Diagnoses from a formatted span and from diagnosis_prompt may differ in
+    # case, spacing and trailing punctuation.
+    def key(diagnosis):
+        return " ".join(diagnosis.split()).strip(" .").lower() if diagnosis else None
+    return key(a) == key(b)
+
+def analyze_consultation(consultation, transcript, reanalysis=False, trace=None):
+    trace = trace or tracer.start(consultation.id)
+    segments = consultation.segments
 
-    # --- Extract structured graph data ---
     graph_data_prompt = f'''You are an assistant that extracts structured data from a medical transcript.
 Given the following transcript:
 {transcript}
@@ -104,104 +329,189 @@ Produce a JSON object with the following keys:
 "severity_trends": an array of objects, each with keys "time" (formatted as HH:MM:SS) and "severity" (one of HIGH, MODERATE, LOW),
 "symptom_timeline": an array of objects, each with keys "time" (formatted as HH:MM:SS) and "symptom" (string).
 Return only valid JSON with no additional commentary.'''
-    try:
-        graph_result = aai.Lemur().task(
-            graph_data_prompt,
-            input_text=graph_data_prompt,
-            final_model=aai.LemurModel.claude3_5_sonnet
-        )
-        data = json.loads(graph_result.response)
-        symptom_counts = data.get("symptom_counts", symptom_counts)
-        severity_trends = data.get("severity_trends", severity_trends)
-        symptom_timeline = data.get("symptom_timeline", symptom_timeline)
+
+    def traced(name, func):
+        def _traced(inputs):
+            with tracer.span(trace, name):
+                return func(inputs)
+        return _traced
+
+    def graph_stage(_):
+        response = lemur_task(graph_data_prompt, graph_data_prompt, task="graph")
+        try:
+            return json.loads(response)
+        except json.JSONDecodeError as e:
+            # The charts fall back to keyword counts below.
+            json_fallbacks.inc(task="graph")
+            print("Graph data was not valid JSON:", e)
+            return None
+
+    def format_stage(text):
+        # Returns a Segment, so its entities are parsed here, once.
+        def _format(_):
+            formatted = lemur_task(base_prompt, text, task="format")
+            print("Formatted transcript:", formatted)
+            return Segment(text, formatted)
+        return _format
+
+    # On re-analysis only new or edited runs of sentences are re-formatted;
+    # unchanged segments are reused from the previous analysis. Edits scattered
+    # over more than MAX_REFORMAT_RUNS runs cost more calls than one full pass.
+    parts = segments.plan(transcript) if reanalysis else [transcript]
+    if sum(isinstance(part, str) for part in parts) > MAX_REFORMAT_RUNS:
+        parts = [transcript]
+    format_names = {i: f"format_{i}" for i, part in enumerate(parts) if isinstance(part, str)}
+
+    def new_segments(inputs):
+        return [inputs[format_names[i]] if i in format_names else part for i, part in enumerate(parts)]
+
+    def splice_stage(inputs):
+        return "<br>".join(segment.formatted for segment in new_segments(inputs))
+
+    # A live utterance or a full re-format carries the diagnosis in its
+    # formatted output. A partial re-analysis asks for the diagnosis of the
+    # whole updated transcript in parallel with formatting; with nothing
+    # re-formatted it stays the same.
+    partial = reanalysis and len(parts) > 1
+
+    def diagnosis_stage(inputs):
+        if reanalysis and not format_names:
+            return segments.diagnosis
+        if partial:
+            answer = re.sub(r'<[^>]+>', '', lemur_task(diagnosis_prompt, transcript, task="diagnosis")).strip()
+            diagnosis = None if not answer or answer.upper() == "NONE" else answer
+        else:
+            diagnosis_matches = [
+                text
+                for segment in new_segments(inputs)
+                for category, text, _ in segment.entities
+                if category == "diagnosis"
+            ]
+            diagnosis = diagnosis_matches[-1] if diagnosis_matches else None
+        if diagnosis:
+            print("Predicted diagnosis:", diagnosis)
+        return diagnosis
+
+    def new_diagnosis_stage(inputs):
+        if reanalysis and same_diagnosis(inputs["diagnosis"], segments.diagnosis):
+            print("Diagnosis unchanged, skipping downstream stages")
+            return None
+        return inputs["diagnosis"]
+
+    def precautions_stage(inputs):
+        precautions_html = lemur_task(precautions_prompt, inputs["new_diagnosis"], task="precautions")
+        print("Precautions:", precautions_html)
+        return precautions_html
+
+    def severity_stage(inputs):
+        severity_html = lemur_task(severity_prompt, inputs["new_diagnosis"], task="severity")
+        print("Severity:", severity_html)
+        return severity_html
+
+    def clinic_stage(inputs):
+        if clinic_directory is not None:
+            clinic_html = clinic_directory.suggestions_html(consultation.user_location, inputs["new_diagnosis"])
+        else:
+            clinic_prompt = clinic_prompt_for(consultation.user_location)
+            clinic_html = lemur_task(clinic_prompt, inputs["new_diagnosis"], ttl=CLINIC_CACHE_TTL, task="clinic")
+        print("Clinic suggestions:", clinic_html)
+        return clinic_html
+
+    # graph and formatting are independent; precautions, severity and clinic
+    # only need the diagnosis. Each event is emitted as soon as its stage ends.
+    results = run_stages(
+        [Stage("graph", traced("graph", graph_stage))]
+        + [Stage(name, traced("format", format_stage(parts[i]))) for i, name in format_names.items()]
+        + [
+            Stage("formatted", splice_stage, deps=tuple(format_names.values()),
+                  on_result=lambda text: emit_traced(trace, 'formatted_transcript', {'text': text})),
+            Stage("diagnosis", traced("diagnosis", diagnosis_stage), deps=() if partial else tuple(format_names.values())),
+            Stage("new_diagnosis", new_diagnosis_stage, deps=("diagnosis",)),
+            Stage("precautions", traced("precautions", precautions_stage), deps=("new_diagnosis",),
+                  on_result=lambda text: emit_traced(trace, 'precautions', {'text': text})),
+            Stage("severity", traced("severity", severity_stage), deps=("new_diagnosis",),
+                  on_result=lambda text: emit_traced(trace, 'severity', {'text': text})),
+            Stage("clinic", traced("clinic", clinic_stage), deps=("new_diagnosis",),
+                  on_result=lambda text: emit_traced(trace, 'clinic_suggestions', {'text': text})),
+        ],
+        pool=stage_pool
+    )
+
+    # --- Structured graph data ---
+    data = results["graph"]
+    # Merged into the chart history; a re-analysis covers the whole transcript
+    # and so replaces the symptom counts instead of adding to them.
+    if isinstance(data, dict):
+        consultation.charts.merge(data, replace=reanalysis)
         print("Graph data extracted:", data)
-    except Exception as e:
-        print("Error parsing graph data from AI:", e)
+    else:
         keywords = ["fever", "cough", "pain", "nausea", "dizziness", "headache"]
         transcript_lower = transcript.lower()
-        for keyword in keywords:
-            count = transcript_lower.count(keyword)
-            if count > 0:
-                symptom_counts[keyword] = symptom_counts.get(keyword, 0) + count
-
-    # --- Generate formatted transcript ---
-    result = aai.Lemur().task(
-        base_prompt,
-        input_text=transcript,
-        final_model=aai.LemurModel.claude3_5_sonnet
-    )
-    formatted = result.response.strip()
-    print("Formatted transcript:", formatted)
+        counts = {keyword: transcript_lower.count(keyword) for keyword in keywords if keyword in transcript_lower}
+        consultation.charts.add_counts(counts, replace=reanalysis)
+
+    # --- Assemble the report in a fixed order, independent of completion order ---
+    formatted = results["formatted"]
+    if formatted is None:
+        return
+    diagnosis_changed = results["new_diagnosis"] is not None
+    # A re-analysis keeps the previous downstream HTML only if it arrived at
+    # the same diagnosis; with no diagnosis at all there is nothing to keep.
+    reuse_downstream = reanalysis and results["diagnosis"] is not None and same_diagnosis(results["diagnosis"], segments.diagnosis)
     if reanalysis:
-        report_transcript = formatted + "<br>"
+        segments.replace(new_segments(results))
+        # The report is replaced, so its entity index is rebuilt from the
+        # segments' entities; only re-formatted segments were parsed again.
+        consultation.entities = EntityIndex()
+        consultation.report_transcript = formatted + "<br>"
+        for segment in segments.segments:
+            consultation.entities.add(segment.formatted, segment.entities)
+        for name in ("precautions", "severity", "clinic"):
+            html = segments.downstream.get(name) if reuse_downstream else results[name]
+            if html is not None:
+                consultation.report_transcript += html + "<br>"
+                consultation.entities.add(html)
     else:
-        report_transcript += formatted + "<br>"
-    socketio.emit('formatted_transcript', {'text': formatted})
-    
-    # --- Extract diagnosis from formatted transcript ---
-    diagnosis_matches = re.findall(r'<span\s+style="color:\s*blue;">(.*?)<\/span>', formatted, re.IGNORECASE)
-    if diagnosis_matches:
-        predicted_diagnosis = diagnosis_matches[0]
-        print("Predicted diagnosis:", predicted_diagnosis)
-        
-        precautions_result = aai.Lemur().task(
-            precautions_prompt,
-            input_text=predicted_diagnosis,
-            final_model=aai.LemurModel.claude3_5_sonnet
-        )
-        precautions_html = precautions_result.response.strip()
-        print("Precautions:", precautions_html)
-        socketio.emit('precautions', {'text': precautions_html})
-        report_transcript += precautions_html + "<br>"
-        
-        severity_result = aai.Lemur().task(
-            severity_prompt,
-            input_text=predicted_diagnosis,
-            final_model=aai.LemurModel.claude3_5_sonnet
-        )
-        severity_html = severity_result.response.strip()
-        print("Severity:", severity_html)
-        socketio.emit('severity', {'text': severity_html})
-        report_transcript += severity_html + "<br>"
-        
-        severity_match = re.search(r'Severity:\s*(HIGH|MODERATE|LOW)', severity_html, re.IGNORECASE)
+        segment = results[format_names[0]]
+        segments.append(segment)
+        consultation.report_transcript += formatted + "<br>"
+        consultation.entities.add(segment.formatted, segment.entities)
+        for name in ("precautions", "severity", "clinic"):
+            if results[name] is not None:
+                consultation.report_transcript += results[name] + "<br>"
+                consultation.entities.add(results[name])
+    if diagnosis_changed or (reanalysis and not reuse_downstream):
+        segments.diagnosis = results["new_diagnosis"]
+        segments.downstream = {name: results[name] for name in ("precautions", "severity", "clinic")}
+
+    severity_html = results["severity"]
+    if severity_html:
+        with tracer.span(trace, "severity_extract"):
+            severity_match = re.search(r'Severity:\s*(HIGH|MODERATE|LOW)', severity_html, re.IGNORECASE)
         if severity_match:
             severity_level = severity_match.group(1).upper()
-            severity_trends.append({
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "severity": severity_level
-            })
-        
-        # --- Generate clinic/hospital suggestions ---
-        if user_location:
-            loc_str = f"latitude {user_location['latitude']}, longitude {user_location['longitude']}"
-        else:
-            loc_str = "a generic urban area"
-        
-        clinic_prompt = f'''You are a healthcare advisor. The patient is located at {loc_str}. Based on the predicted diagnosis provided below, suggest a list of nearby clinics and hospitals that specialize in this condition.
-Format your answer in HTML as an unordered list (<ul>...</ul>).
-For each suggestion, include:
-- The Clinic/Hospital Name
-- The Address
-- The Contact Information
-- A "Get Directions" button that is an anchor tag (<a>) opening Google Maps in a new tab.
-Format the "Get Directions" link so that the href is: "https://www.google.com/maps/search/?api=1&query=CLINIC_ADDRESS"
-Do not include any extra commentary.'''
-        
-        clinic_result = aai.Lemur().task(
-            clinic_prompt,
-            input_text=predicted_diagnosis,
-            final_model=aai.LemurModel.claude3_5_sonnet
-        )
-        clinic_html = clinic_result.response.strip()
-        print("Clinic suggestions:", clinic_html)
-        socketio.emit('clinic_suggestions', {'text': clinic_html})
-        report_transcript += clinic_html + "<br>"
+            consultation.charts.add_severity(datetime.now().strftime("%H:%M:%S"), severity_level)
+
+def offer_suggestions(unclear_word, suggestions):
+    # The socket.io session belongs to this socket, so offers do not leak
+    # between tabs and go away on disconnect.
+    offered = [text for text in session.get('offered_suggestions', []) if text not in suggestions]
+    session['offered_suggestions'] = (offered + suggestions)[-MAX_OFFERED_SUGGESTIONS:]
+    emit('correction_suggestions', {'word': unclear_word, 'suggestions': suggestions})
 
 @socketio.on('suggest_correction')
 def handle_suggest_correction(data):
     unclear_word = data.get('word')
     context = data.get('context', '')
+    with tracer.span(None, "suggest_local"):
+        candidates = medical_vocabulary.suggest(unclear_word or '', context)
+    local_suggestions = [term for term, _ in candidates]
+    if candidates and candidates[0][1] >= SUGGESTION_CONFIDENCE:
+        correction_sources.inc(source="local")
+        offer_suggestions(unclear_word, local_suggestions)
+        return
+
+    correction_sources.inc(source="lemur")
     suggestion_prompt = f"""
 You are an AI language assistant specialized in medical transcription.
 An unclear word "{unclear_word}" appears in the following transcript context:
@@ -210,22 +520,51 @@ Please provide three correction suggestions that are phonetically similar and me
 Return your answer as a JSON array of strings with no extra commentary.
 """
     try:
-        suggestion_result = aai.Lemur().task(
-            suggestion_prompt,
-            input_text=suggestion_prompt,
-            final_model=aai.LemurModel.claude3_5_sonnet
-        )
-        suggestions = json.loads(suggestion_result.response)
-        emit('correction_suggestions', {'word': unclear_word, 'suggestions': suggestions})
+        suggestions = json.loads(lemur_task(suggestion_prompt, suggestion_prompt, task="suggestion"))
+    except json.JSONDecodeError as e:
+        json_fallbacks.inc(task="suggestion")
+        print("Suggestions were not valid JSON:", e)
+        suggestions = []
     except Exception as e:
         print("Error generating suggestions:", e)
-        emit('correction_suggestions', {'word': unclear_word, 'suggestions': []})
+        suggestions = []
+    # LeMUR's answers first, topped up with the best local candidates.
+    suggestions = [text for text in suggestions if isinstance(text, str)] if isinstance(suggestions, list) else []
+    suggestions = list(dict.fromkeys(suggestions + local_suggestions))[:3]
+    offer_suggestions(unclear_word, suggestions)
+
+@socketio.on('accept_correction')
+def handle_accept_correction(data):
+    # Sent when the clinician picks one of the suggestions; it ranks higher
+    # from now on, and a term only LeMUR knew becomes a local candidate. Only
+    # a suggestion this socket was offered counts, and only once per offer.
+    suggestion = data.get('suggestion')
+    offered = session.get('offered_suggestions', [])
+    if suggestion in offered:
+        offered.remove(suggestion)
+        session['offered_suggestions'] = offered
+        medical_vocabulary.learn(suggestion)
 
 @socketio.on('re_analyze_transcript')
 def handle_re_analyze_transcript(data):
     updated_transcript = data.get('updated_transcript', '')
-    if updated_transcript:
-        analyze_transcript(updated_transcript, reanalysis=True)
+    if updated_transcript and 'consultation_id' in session:
+        analyze_transcript(session['consultation_id'], updated_transcript, reanalysis=True)
+
+def current_consultation_id():
+    # Issued on the first page load; the socket.io handshake carries the same cookie.
+    if 'consultation_id' not in session:
+        session['consultation_id'] = uuid.uuid4().hex
+    return session['consultation_id']
+
+@app.before_request
+def ensure_consultation_id():
+    current_consultation_id()
+
+@socketio.on('connect')
+def handle_connect():
+    if 'consultation_id' in session:
+        join_room(session['consultation_id'])
 
 @app.route('/')
 def index():
@@ -239,58 +578,78 @@ def trans():
 def login():
     return render_template('login.html')
 
+def chart_payload(consultation):
+    data = consultation.charts.delta()
+    data["symptom_counts"] = data["symptom_counts"] or {"fever": 0, "cough": 0, "pain": 0}
+    data["severity_trends"] = data["severity_trends"] or [{"time": datetime.now().strftime("%H:%M:%S"), "severity": "LOW"}]
+    return data
+
 @app.route('/chart_data')
 def chart_data():
-    global symptom_counts, severity_trends, symptom_timeline
-    if not symptom_counts:
-        symptom_counts = {"fever": 0, "cough": 0, "pain": 0}
-    if not severity_trends:
-        severity_trends = [{"time": datetime.now().strftime("%H:%M:%S"), "severity": "LOW"}]
-    data = {
-        "symptom_counts": symptom_counts,
-        "severity_trends": severity_trends,
-        "symptom_timeline": symptom_timeline
-    }
-    return json.dumps(data)
+    # ?since=<version> returns only the changes after that version; the ETag
+    # is the current version, so an unchanged dashboard gets a 304.
+    consultation = consultations.get(current_consultation_id())
+    since = request.args.get('since', type=int)
+    data = chart_payload(consultation) if since is None else consultation.charts.delta(since)
+    response = make_response(json.dumps(data))
+    response.headers['Content-Type'] = 'application/json'
+    response.set_etag(str(consultation.charts.version))
+    return response.make_conditional(request)
+
+def render_report(consultation, **extra):
+    entities = consultation.entities
+    with tracer.span(None, "render_report", consultation=consultation.id):
+        return render_template(
+            'report.html',
+            phi=entities.texts("phi"),
+            medical_history=entities.texts("medical_history"),
+            anatomy=entities.texts("anatomy"),
+            medication=entities.texts("medication"),
+            tests=entities.texts("tests"),
+            diagnosis=entities.texts("diagnosis"),
+            severity=entities.texts("severity"),
+            report_transcript=consultation.report_transcript,
+            **extra
+        )
 
 @app.route('/report')
 def report():
-    global report_transcript
-    phi_items = re.findall(r'<span\s+style="color:\s*red;">(.*?)<\/span>', report_transcript, re.IGNORECASE)
-    medical_history_items = re.findall(r'<span\s+style="background-color:\s*lightgreen;">(.*?)<\/span>', report_transcript, re.IGNORECASE)
-    anatomy_items = re.findall(r'<em>(.*?)<\/em>', report_transcript, re.IGNORECASE)
-    medication_items = re.findall(r'<span\s+style="background-color:\s*yellow;">(.*?)<\/span>', report_transcript, re.IGNORECASE)
-    tests_items = re.findall(r'<span\s+style="color:\s*darkblue;">(.*?)<\/span>', report_transcript, re.IGNORECASE)
-    diagnosis_items = re.findall(r'<span\s+style="color:\s*blue;">(.*?)<\/span>', report_transcript, re.IGNORECASE)
-    severity_items = re.findall(r'<span\s+class="severity">(.*?)<\/span>', report_transcript, re.IGNORECASE)
-    return render_template(
-        'report.html',
-        phi=phi_items,
-        medical_history=medical_history_items,
-        anatomy=anatomy_items,
-        medication=medication_items,
-        tests=tests_items,
-        diagnosis=diagnosis_items,
-        severity=severity_items,
-        report_transcript=report_transcript
-    )
+    return render_report(consultations.get(current_consultation_id()))
+
+@app.route('/analysis_queue')
+def analysis_queue():
+    response = make_response(json.dumps(analysis_scheduler.stats()))
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
 
-def generate_pdf():
-    chrome_path = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
-    async def _generate():
-        browser = await launch(executablePath=chrome_path, args=['--no-sandbox'])
-        page = await browser.newPage()
-        await page.goto('http://localhost:5000/report', {'waitUntil': 'networkidle0'})
-        await page.waitFor(3000)
-        pdf_bytes = await page.pdf({'format': 'A4', 'printBackground': True})
-        await browser.close()
-        return pdf_bytes
-    import asyncio
-    return asyncio.get_event_loop().run_until_complete(_generate())
+@app.route('/report/entities')
+def report_entities():
+    response = make_response(consultations.get(current_consultation_id()).entities.to_json())
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+def generate_pdf(consultation):
+    base_url = request.host_url
+    with tracer.span(None, "generate_pdf", consultation=consultation.id):
+        return pdf_cache.render(
+            [consultation.to_dict(), base_url],
+            lambda: render_report(
+                consultation,
+                pdf_mode=True,
+                chart_data=chart_payload(consultation),
+                base_url=base_url
+            )
+        )
 
 @app.route('/download_pdf')
 def download_pdf():
-    pdf_bytes = generate_pdf()
+    pdf_bytes = generate_pdf(consultations.get(current_consultation_id()))
     response = make_response(pdf_bytes)
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = 'attachment; filename=report.pdf'
@@ -298,21 +657,96 @@ def download_pdf():
 
 @socketio.on('toggle_transcription')
 def handle_toggle_transcription(data):
+    if 'consultation_id' not in session:
+        return
     language = data.get('language', 'english')
     location = data.get('location')
-    global user_location, transcriber, session_id
+    consultation_id = session['consultation_id']
     if location:
-        user_location = location
+        with consultations.edit(consultation_id) as consultation:
+            consultation.user_location = location
     with transcriber_lock:
-        if session_id:
-            if transcriber:
-                print("Closing transcriber session")
-                transcriber.close()
-                transcriber = None
-                session_id = None
-        else:
-            print("Starting transcriber session with language:", language)
-            threading.Thread(target=transcribe_real_time, args=(language,)).start()
+        live = transcribers.get(consultation_id)
+        if live and live["session_id"]:
+            del transcribers[consultation_id]
+    if live and live["session_id"]:
+        print("Closing transcriber session")
+        live["transcriber"].close()
+    else:
+        print("Starting transcriber session with language:", language)
+        threading.Thread(target=transcribe_real_time, args=(consultation_id, language)).start()
+
+@socketio.on('audio_start')
+def handle_audio_start(data):
+    if 'consultation_id' not in session:
+        return
+    consultation_id = session['consultation_id']
+    with consultations.edit(consultation_id) as consultation:
+        consultation.current_language = (data.get('language') or "english").lower()
+        if data.get('location'):
+            consultation.user_location = data['location']
+    stop_audio_stream(consultation_id)
+    try:
+        transcriber = transcriber_factory(consultation_id)
+        stream = AudioStream(
+            transcriber,
+            sample_rate=int(data.get('sample_rate', 48_000)),
+            channels=int(data.get('channels', 1)),
+            sample_format=data.get('format', 'f32'),
+            send_ms=AUDIO_SEND_MS,
+            buffer_ms=AUDIO_BUFFER_MS,
+            max_chunk_bytes=AUDIO_MAX_CHUNK_BYTES
+        )
+    except ValueError as e:
+        emit('audio_error', {'text': str(e)})
+        return
+    with transcriber_lock:
+        transcribers[consultation_id] = {"transcriber": transcriber, "session_id": None}
+    # The stream only takes chunks once the transcriber has connected, so a
+    # failed connect does not leave a dead stream behind.
+    try:
+        transcriber.connect()
+        failed = False
+    except Exception as e:
+        print("Realtime connect failed:", e)
+        failed = True
+    with transcriber_lock:
+        ours = transcribers.get(consultation_id, {}).get("transcriber") is transcriber
+        if ours and not failed:
+            audio_streams[consultation_id] = {"stream": stream, "sid": request.sid}
+        elif ours:
+            del transcribers[consultation_id]
+    if failed or not ours:
+        emit('audio_error', {'text': "Could not connect to the transcription service"})
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(chunk):
+    live = audio_streams.get(session.get('consultation_id'))
+    if live is None or live["sid"] != request.sid or not isinstance(chunk, (bytes, bytearray)):
+        return
+    try:
+        live["stream"].feed(chunk)
+    except ValueError as e:
+        emit('audio_error', {'text': str(e)})
+
+def stop_audio_stream(consultation_id, sid=None):
+    # With sid, only stops the stream if that socket owns it.
+    with transcriber_lock:
+        live = audio_streams.get(consultation_id)
+        if live is None or (sid is not None and live["sid"] != sid):
+            return
+        del audio_streams[consultation_id]
+    live["stream"].close()
+
+@socketio.on('audio_stop')
+def handle_audio_stop(data=None):
+    if 'consultation_id' in session:
+        stop_audio_stream(session['consultation_id'], request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    if 'consultation_id' in session:
+        stop_audio_stream(session['consultation_id'], request.sid)
 
 if __name__ == '__main__':
     socketio.run(app, debug=True)
@@ -0,0 +1,172 @@
+import threading
+import uuid
+import wave
+from datetime import datetime, timedelta
+
+import numpy as np
+import soxr
+import assemblyai as aai
+
+TARGET_RATE = 16_000  # what the realtime transcriber expects
+SAMPLE_FORMATS = {"f32": np.float32, "s16": np.int16}
+
+
+class AudioRingBuffer:
+    # Preallocated ring of 16-bit samples. Incoming arrays are copied straight
+    # into place; when the buffer is full the oldest samples are dropped.
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+
+    def write(self, samples):
+        if len(samples) > self.capacity:
+            self.dropped += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        overflow = self.count + len(samples) - self.capacity
+        if overflow > 0:
+            self.start = (self.start + overflow) % self.capacity
+            self.count -= overflow
+            self.dropped += overflow
+        end = (self.start + self.count) % self.capacity
+        first = min(len(samples), self.capacity - end)
+        self.data[end:end + first] = samples[:first]
+        self.data[:len(samples) - first] = samples[first:]
+        self.count += len(samples)
+
+    def read(self, n):
+        n = min(n, self.count)
+        first = min(n, self.capacity - self.start)
+        block = self.data[self.start:self.start + first].tobytes()
+        if first < n:
+            block += self.data[:n - first].tobytes()
+        self.start = (self.start + n) % self.capacity
+        self.count -= n
+        return block
+
+
+class AudioStream:
+    # Turns browser audio chunks (interleaved PCM at any rate) into 16 kHz mono
+    # 16-bit audio and forwards it to a transcriber in send_ms blocks.
+    def __init__(self, transcriber, sample_rate, channels=1, sample_format="f32",
+                 send_ms=100, buffer_ms=5000, max_chunk_bytes=64 * 1024):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported audio format: {sample_format}")
+        self.transcriber = transcriber
+        self.channels = channels
+        self.dtype = SAMPLE_FORMATS[sample_format]
+        self.max_chunk_bytes = max_chunk_bytes
+        self.send_samples = TARGET_RATE * send_ms // 1000
+        self.buffer = AudioRingBuffer(TARGET_RATE * buffer_ms // 1000)
+        self.resampler = None
+        if sample_rate != TARGET_RATE:
+            self.resampler = soxr.ResampleStream(sample_rate, TARGET_RATE, 1, dtype="float32")
+        self.lock = threading.Lock()
+        self.samples_in = 0
+        self.closed = False
+
+    def feed(self, chunk):
+        if len(chunk) > self.max_chunk_bytes:
+            raise ValueError(f"Audio chunk of {len(chunk)} bytes exceeds {self.max_chunk_bytes}")
+        # frombuffer is a view over the socket.io payload, not a copy.
+        samples = np.frombuffer(chunk, dtype=self.dtype, count=len(chunk) // np.dtype(self.dtype).itemsize)
+        if self.channels > 1:
+            # Averaged as float, then cast back so _push sees the input format
+            # and scales 16-bit samples the same way as mono ones.
+            frames = samples[:len(samples) - len(samples) % self.channels].reshape(-1, self.channels)
+            samples = frames.mean(axis=1, dtype=np.float32).astype(self.dtype)
+        with self.lock:
+            if self.closed:
+                return
+            self.samples_in += len(samples)
+            self._push(samples)
+
+    def _push(self, samples, last=False):
+        if self.resampler is not None:
+            if self.dtype is np.int16:
+                samples = samples.astype(np.float32) / 32768
+            samples = self.resampler.resample_chunk(np.asarray(samples, dtype=np.float32), last=last)
+        if samples.dtype != np.int16:
+            samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+        self.buffer.write(samples)
+        while self.buffer.count >= self.send_samples:
+            self.transcriber.stream(self.buffer.read(self.send_samples))
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.resampler is not None:
+                self._push(np.zeros(0, dtype=np.float32), last=True)
+            if self.buffer.count:
+                self.transcriber.stream(self.buffer.read(self.buffer.count))
+        self.transcriber.close()
+
+
+class ReplayTranscriber:
+    # Stand-in for aai.RealtimeTranscriber: accepts audio like the real one
+    # and emits the next scripted final transcript for every
+    # seconds_per_transcript of audio it receives.
+    def __init__(self, on_data, on_open=None, on_close=None, on_error=None,
+                 transcripts=(), seconds_per_transcript=2.0):
+        self.on_data = on_data
+        self.on_open = on_open
+        self.on_close = on_close
+        self.transcripts = list(transcripts)
+        self.bytes_per_transcript = int(seconds_per_transcript * TARGET_RATE) * 2
+        self.received = 0
+        self.emitted = 0
+
+    @classmethod
+    def from_wav(cls, path, **kwargs):
+        # Transcript lines are read from a .txt file next to the WAV, if any.
+        try:
+            with open(path.rsplit(".", 1)[0] + ".txt", encoding="utf-8") as f:
+                kwargs.setdefault("transcripts", [line.strip() for line in f if line.strip()])
+        except FileNotFoundError:
+            pass
+        return cls(**kwargs)
+
+    def connect(self):
+        if self.on_open:
+            self.on_open(aai.RealtimeSessionOpened(
+                session_id=uuid.uuid4(),
+                expires_at=datetime.now() + timedelta(hours=1)
+            ))
+
+    def stream(self, data):
+        self.received += len(data)
+        while self.emitted < len(self.transcripts) and self.received >= (self.emitted + 1) * self.bytes_per_transcript:
+            audio_end = (self.emitted + 1) * self.bytes_per_transcript * 1000 // (TARGET_RATE * 2)
+            self.on_data(aai.RealtimeFinalTranscript(
+                audio_start=audio_end - self.bytes_per_transcript * 1000 // (TARGET_RATE * 2),
+                audio_end=audio_end,
+                confidence=1.0,
+                text=self.transcripts[self.emitted],
+                words=[],
+                created=datetime.now(),
+                punctuated=True,
+                text_formatted=True
+            ))
+            self.emitted += 1
+
+    def close(self):
+        if self.on_close:
+            self.on_close()
+
+
+def wav_chunks(path, chunk_ms=100):
+    # Yields (sample_rate, channels, bytes) chunks of 16-bit PCM from a WAV file.
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files are supported")
+        rate, channels = wav.getframerate(), wav.getnchannels()
+        frames = rate * chunk_ms // 1000
+        while True:
+            data = wav.readframes(frames)
+            if not data:
+                return
+            yield rate, channels, data
@@ -0,0 +1,106 @@
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from audio_ingest import AudioStream, ReplayTranscriber, wav_chunks
+
+
+def synthetic_chunks(seconds, sample_rate=48_000, chunk_ms=100):
+    # A 440 Hz tone as browser-style Float32 PCM.
+    frames = sample_rate * chunk_ms // 1000
+    t = np.arange(frames, dtype=np.float32) / sample_rate
+    tone = (0.2 * np.sin(2 * np.pi * 440 * t)).astype(np.float32).tobytes()
+    for _ in range(seconds * 1000 // chunk_ms):
+        yield sample_rate, 1, tone
+
+
+def load_chunks(args):
+    if args.wav:
+        return list(wav_chunks(args.wav, args.chunk_ms)), "s16"
+    return list(synthetic_chunks(args.seconds, chunk_ms=args.chunk_ms)), "f32"
+
+
+def run_direct(index, chunks, sample_format, args, results):
+    rate, channels, _ = chunks[0]
+    transcriber = ReplayTranscriber(on_data=lambda transcript: None)
+    stream = AudioStream(transcriber, rate, channels, sample_format, send_ms=args.send_ms)
+    latencies = []
+    for _, _, data in chunks:
+        start = time.perf_counter()
+        stream.feed(data)
+        latencies.append(time.perf_counter() - start)
+    stream.close()
+    results[index] = (transcriber.received / (16_000 * 2), latencies)
+
+
+def run_socketio(index, chunks, sample_format, args, results):
+    import app
+    client = app.app.test_client()
+    client.get('/')
+    socket = app.socketio.test_client(app.app, flask_test_client=client)
+    rate, channels, _ = chunks[0]
+    socket.emit('audio_start', {'sample_rate': rate, 'channels': channels, 'format': sample_format})
+    with client.session_transaction() as flask_session:
+        stream = app.audio_streams[flask_session['consultation_id']]["stream"]
+    latencies = []
+    for _, _, data in chunks:
+        start = time.perf_counter()
+        socket.emit('audio_chunk', data)
+        latencies.append(time.perf_counter() - start)
+    transcriber = stream.transcriber
+    socket.emit('audio_stop')
+    socket.disconnect()
+    results[index] = (transcriber.received / (16_000 * 2), latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how many concurrent browser audio streams one process can ingest.")
+    parser.add_argument("--streams", type=int, default=8)
+    parser.add_argument("--seconds", type=int, default=30, help="length of the synthetic audio per stream")
+    parser.add_argument("--wav", help="16-bit PCM WAV file to replay instead of a synthetic tone")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--send-ms", type=int, default=100)
+    parser.add_argument("--socketio", action="store_true", help="go through the app's socket.io handlers")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    chunks, sample_format = load_chunks(args)
+    if args.socketio:
+        import app
+        app.transcriber_factory = lambda consultation_id: ReplayTranscriber(on_data=lambda transcript: None)
+    target = run_socketio if args.socketio else run_direct
+
+    results = {}
+    threads = [threading.Thread(target=target, args=(i, chunks, sample_format, args, results)) for i in range(args.streams)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    audio_seconds = sum(seconds for seconds, _ in results.values())
+    latencies = np.array([latency for _, stream_latencies in results.values() for latency in stream_latencies])
+    summary = {
+        "streams": args.streams,
+        "mode": "socketio" if args.socketio else "direct",
+        "audio_seconds": round(audio_seconds, 2),
+        "wall_seconds": round(elapsed, 3),
+        "realtime_factor": round(audio_seconds / elapsed, 1),
+        "chunk_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "chunk_ms_p99": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+    # Streams arrive in real time, so the realtime factor is roughly how many
+    # concurrent streams this process could keep up with.
+    summary["sustainable_streams"] = int(summary["realtime_factor"])
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
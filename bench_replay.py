@@ -0,0 +1,246 @@
+import argparse
+import json
+import re
+import threading
+import time
+import tracemalloc
+from functools import partial
+
+import assemblyai as aai
+
+import app
+import pipeline
+from audio_ingest import ReplayTranscriber, TARGET_RATE
+from lemur_cache import LemurCache
+from replay import StubLemur, load_recording
+
+SAMPLE_UTTERANCES = [
+    "Hello doctor, my name is Priya and I am 34 years old.",
+    "I have had a fever and a cough for the last three days.",
+    "The headache gets worse in the evening and I feel some nausea.",
+    "I took paracetamol twice yesterday but the fever came back.",
+    "There is also pain in my chest when I cough.",
+    "No, I have not had any blood tests yet.",
+    "I sometimes feel dizziness when I stand up quickly.",
+    "My sleep has been poor and I feel fatigue all day.",
+]
+
+
+class StubPdfRenderer:
+    # Measures report HTML generation and caching without a browser.
+    def render(self, html):
+        return b"%PDF-stub " + html.encode("utf-8")
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def synthetic_sessions(sessions, utterances, interval):
+    return {
+        f"synthetic-{i}": [
+            {"t": n * interval, "text": SAMPLE_UTTERANCES[(i + n) % len(SAMPLE_UTTERANCES)]}
+            for n in range(utterances)
+        ]
+        for i in range(sessions)
+    }
+
+
+class EventLog:
+    # Wraps socketio.emit to timestamp every event per consultation room.
+    def __init__(self, socketio):
+        self.events = {}
+        self.lock = threading.Lock()
+        self.emit = socketio.emit
+        socketio.emit = self._emit
+
+    def _emit(self, event, *args, **kwargs):
+        room = kwargs.get("to") or kwargs.get("room")
+        if room:
+            with self.lock:
+                self.events.setdefault(room, []).append((time.monotonic(), event))
+        return self.emit(event, *args, **kwargs)
+
+    def latencies(self, target):
+        # Time from each final transcript to the next `target` event of the
+        # same consultation; transcripts merged into one job share that event.
+        result = []
+        with self.lock:
+            for events in self.events.values():
+                waiting = []
+                for at, event in events:
+                    if event == "transcript":
+                        waiting.append(at)
+                    elif event == target and waiting:
+                        result.extend(at - started for started in waiting)
+                        waiting = []
+        return result
+
+
+def run_session(utterances, speed, scripts):
+    client = app.app.test_client()
+    client.get('/')
+    with client.session_transaction() as flask_session:
+        scripts[flask_session['consultation_id']] = [utterance["text"] for utterance in utterances]
+    socket = app.socketio.test_client(app.app, flask_test_client=client)
+    socket.emit('audio_start', {'sample_rate': TARGET_RATE, 'channels': 1, 'format': 's16'})
+    # Each transcript is released by 100 ms of silence fed to the replay transcriber.
+    silence = bytes(TARGET_RATE // 10 * 2)
+    started = time.monotonic()
+    for utterance in utterances:
+        delay = utterance["t"] / speed - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+        socket.emit('audio_chunk', silence)
+    return client, socket
+
+
+def wait_for_scheduler(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = app.analysis_scheduler.stats()
+        if stats["queue_depth"] == 0 and stats["running"] == 0:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def time_request(client, path, samples):
+    start = time.perf_counter()
+    response = client.get(path)
+    samples.append(time.perf_counter() - start)
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay consultations against stubbed AssemblyAI and measure the pipeline.")
+    parser.add_argument("--recording", help="JSONL recording made with SESSION_RECORDING; synthetic sessions if omitted")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--utterances", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between synthetic utterances")
+    parser.add_argument("--speed", type=float, default=10.0, help="replay speed-up relative to recorded timing")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub LeMUR latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--ignore-recorded-latency", action="store_true")
+    parser.add_argument("--no-cache", action="store_true", help="disable the LeMUR response cache")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc memory tracking")
+    parser.add_argument("--pdf", choices=["stub", "app"], default="stub",
+                        help="'app' uses the configured PDF backend, which needs a browser or wkhtmltopdf")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    if args.recording:
+        transcripts, responses = load_recording(args.recording)
+        sessions = {consultation: events for consultation, events in transcripts.items()}
+    else:
+        responses = {}
+        sessions = synthetic_sessions(args.sessions, args.utterances, args.interval)
+
+    lemur = StubLemur(responses, args.latency, args.jitter, use_recorded_latency=not args.ignore_recorded_latency, seed=1)
+    aai.Lemur = lemur
+    if args.no_cache:
+        app.lemur_cache = LemurCache(max_entries=0)
+    if args.pdf == "stub":
+        app.pdf_cache.renderer = StubPdfRenderer()
+    scripts = {}
+    app.transcriber_factory = lambda consultation_id: ReplayTranscriber(
+        on_data=partial(app.on_data, consultation_id),
+        on_open=partial(app.on_open, consultation_id),
+        on_close=partial(app.on_close, consultation_id),
+        transcripts=scripts.pop(consultation_id, []),
+        seconds_per_transcript=0.1
+    )
+
+    stage_seconds = {}
+    stage_status = {}
+    stage_lock = threading.Lock()
+
+    def record_stage(name, seconds, status):
+        name = re.sub(r'_\d+$', '', name)
+        with stage_lock:
+            stage_status.setdefault(name, {}).setdefault(status, 0)
+            stage_status[name][status] += 1
+            if status == "ok":
+                stage_seconds.setdefault(name, []).append(seconds)
+
+    pipeline.timing_hooks.append(record_stage)
+    events = EventLog(app.socketio)
+
+    memory = []
+    sampling = threading.Event()
+
+    def sample_memory():
+        while not sampling.wait(0.2):
+            memory.append(tracemalloc.get_traced_memory()[0])
+
+    if not args.no_memory:
+        tracemalloc.start()
+        memory.append(tracemalloc.get_traced_memory()[0])
+        threading.Thread(target=sample_memory, daemon=True).start()
+
+    clients = []
+
+    def drive(utterances):
+        clients.append(run_session(utterances, args.speed, scripts))
+
+    threads = [threading.Thread(target=drive, args=(utterances,)) for utterances in sessions.values()]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    drained = wait_for_scheduler(timeout=120)
+    elapsed = time.perf_counter() - started
+
+    if not args.no_memory:
+        sampling.set()
+        memory.append(tracemalloc.get_traced_memory()[0])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    http = {"report": [], "chart_data": [], "pdf_cold": [], "pdf_warm": []}
+    for client, socket in clients:
+        time_request(client, '/report', http["report"])
+        time_request(client, '/chart_data', http["chart_data"])
+        time_request(client, '/download_pdf', http["pdf_cold"])
+        time_request(client, '/download_pdf', http["pdf_warm"])
+        socket.emit('audio_stop')
+        socket.disconnect()
+
+    total_utterances = sum(len(utterances) for utterances in sessions.values())
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "sessions": len(sessions),
+        "utterances": total_utterances,
+        "wall_seconds": round(elapsed, 3),
+        "drained": drained,
+        "stages": {name: dict(percentiles(seconds), **stage_status.get(name, {})) for name, seconds in sorted(stage_seconds.items())},
+        "time_to_formatted_transcript": percentiles(events.latencies("formatted_transcript")),
+        "time_to_clinic_suggestions": percentiles(events.latencies("clinic_suggestions")),
+        "http": {name: percentiles(samples) for name, samples in http.items()},
+        "lemur": {"calls": lemur.calls, "recorded_hits": lemur.recorded_hits},
+        "lemur_cache": app.lemur_cache.stats(),
+        "scheduler": app.analysis_scheduler.stats(),
+    }
+    if not args.no_memory:
+        results["memory"] = {
+            "start_bytes": memory[0],
+            "end_bytes": memory[-1],
+            "peak_bytes": peak,
+            "growth_bytes_per_utterance": round((memory[-1] - memory[0]) / max(total_utterances, 1)),
+        }
+
+    print(json.dumps(results, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
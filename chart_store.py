@@ -0,0 +1,236 @@
+from array import array
+
+SEVERITY_LEVELS = ("LOW", "MODERATE", "HIGH")
+
+
+def to_seconds(clock):
+    # "HH:MM:SS" -> seconds since midnight; anything unparsable maps to 0.
+    try:
+        hours, minutes, seconds = (int(part) for part in clock.split(":"))
+        return hours * 3600 + minutes * 60 + seconds
+    except (AttributeError, ValueError):
+        return 0
+
+
+def to_clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class TimeSeries:
+    # Fixed-capacity ring of (time, value, version) points held in
+    # preallocated arrays. With a reducer, a full buffer is downsampled 2:1
+    # (keeping the later time of each pair) instead of overwriting its oldest
+    # point, so a long session keeps its full span at a coarser resolution.
+    def __init__(self, capacity, typecode, reducer=None):
+        self.capacity = capacity
+        self.reducer = reducer
+        self.times = array('i', bytes(4 * capacity))
+        self.values = array(typecode, [0]) * capacity
+        self.versions = array('q', [0]) * capacity
+        self.start = 0
+        self.count = 0
+        self.reset_version = 0
+
+    def _slot(self, i):
+        return (self.start + i) % self.capacity
+
+    def last(self):
+        if not self.count:
+            return None
+        slot = self._slot(self.count - 1)
+        return self.times[slot], self.values[slot]
+
+    def append(self, time, value, version):
+        if self.count == self.capacity:
+            if self.reducer:
+                self._downsample(version)
+            else:
+                self.start = (self.start + 1) % self.capacity
+                self.count -= 1
+        slot = self._slot(self.count)
+        self.times[slot] = time
+        self.values[slot] = value
+        self.versions[slot] = version
+        self.count += 1
+
+    def clear(self, version):
+        self.start = 0
+        self.count = 0
+        self.reset_version = version
+
+    def _downsample(self, version):
+        points = list(self.points())
+        merged = []
+        for i in range(0, len(points) - 1, 2):
+            (_, first, _), (time, second, _) = points[i], points[i + 1]
+            merged.append((time, self.reducer(first, second)))
+        if len(points) % 2:
+            merged.append(points[-1][:2])
+        self.start = 0
+        self.count = 0
+        for time, value in merged:
+            slot = self.count
+            self.times[slot] = time
+            self.values[slot] = value
+            self.versions[slot] = version
+            self.count += 1
+        self.reset_version = version
+
+    def points(self, since=0):
+        # Points are stored in version order, so skip older ones by bisection.
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.versions[self._slot(middle)] <= since:
+                low = middle + 1
+            else:
+                high = middle
+        for i in range(low, self.count):
+            slot = self._slot(i)
+            yield self.times[slot], self.values[slot], self.versions[slot]
+
+    def to_dict(self):
+        return {"points": [list(point) for point in self.points()], "reset_version": self.reset_version}
+
+    def load(self, data):
+        for time, value, version in data["points"]:
+            self.append(time, value, version)
+        self.reset_version = data["reset_version"]
+
+
+class ChartStore:
+    # Chart data for one consultation. Every change bumps a monotonically
+    # increasing version, and delta(since) returns only what changed after it.
+    # Deltas only ever append points; a client must drop its oldest points
+    # beyond the capacity it was sent, and must start over when reset is true
+    # (after severity downsampling, a re-analysis that replaced a series, or
+    # when its version is unknown).
+    def __init__(self, capacity=512):
+        self.version = 0
+        self.symptom_counts = {}
+        self.count_versions = {}
+        self.severity = TimeSeries(capacity, 'b', reducer=max)
+        self.timeline = TimeSeries(capacity, 'H')
+        self.symptoms = []
+        self.symptom_ids = {}
+
+    def _bump(self):
+        self.version += 1
+        return self.version
+
+    def add_counts(self, counts, replace=False):
+        # Live utterances add to the totals; a full re-analysis replaces them.
+        if replace:
+            for symptom in list(self.symptom_counts):
+                if symptom not in counts:
+                    self.symptom_counts[symptom] = 0
+                    self.count_versions[symptom] = self._bump()
+        for symptom, count in counts.items():
+            if not isinstance(count, int) or count < 0:
+                continue
+            total = count if replace else self.symptom_counts.get(symptom, 0) + count
+            if total != self.symptom_counts.get(symptom):
+                self.symptom_counts[symptom] = total
+                self.count_versions[symptom] = self._bump()
+
+    def _severity_point(self, clock, severity):
+        severity = str(severity).upper()
+        if severity not in SEVERITY_LEVELS:
+            return None
+        return to_seconds(clock), SEVERITY_LEVELS.index(severity)
+
+    def _timeline_point(self, clock, symptom):
+        if not symptom:
+            return None
+        symptom = str(symptom)
+        if symptom not in self.symptom_ids:
+            self.symptom_ids[symptom] = len(self.symptoms)
+            self.symptoms.append(symptom)
+        return to_seconds(clock), self.symptom_ids[symptom]
+
+    def _add(self, series, point):
+        if point is not None and series.last() != point:
+            series.append(point[0], point[1], self._bump())
+
+    def _replace(self, series, points):
+        # Starts the series over, unless the extraction left it unchanged.
+        points = [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
+        if [point[:2] for point in series.points()] == points:
+            return
+        series.clear(self._bump())
+        for point in points:
+            self._add(series, point)
+
+    def add_severity(self, clock, severity):
+        self._add(self.severity, self._severity_point(clock, severity))
+
+    def add_timeline(self, clock, symptom):
+        self._add(self.timeline, self._timeline_point(clock, symptom))
+
+    def merge(self, data, replace=False):
+        # Merges one graph-data extraction into the history. With replace (a
+        # re-analysis of the whole transcript) each series it contains is
+        # replaced instead, so repeated edits do not duplicate points.
+        counts = data.get("symptom_counts")
+        if isinstance(counts, dict):
+            self.add_counts(counts, replace=replace)
+        for key, series, to_point, field in (
+            ("severity_trends", self.severity, self._severity_point, "severity"),
+            ("symptom_timeline", self.timeline, self._timeline_point, "symptom"),
+        ):
+            items = data.get(key)
+            if not isinstance(items, list):
+                continue
+            points = [to_point(item.get("time"), item.get(field)) for item in items if isinstance(item, dict)]
+            points = [point for point in points if point is not None]
+            if replace:
+                self._replace(series, points)
+            else:
+                for point in points:
+                    self._add(series, point)
+
+    def delta(self, since=0):
+        reset = (since <= 0 or since > self.version
+                 or since < self.severity.reset_version or since < self.timeline.reset_version)
+        if reset:
+            since = 0
+        return {
+            "version": self.version,
+            "reset": reset,
+            "capacity": self.timeline.capacity,
+            "symptom_counts": {
+                symptom: count for symptom, count in self.symptom_counts.items()
+                if self.count_versions[symptom] > since
+            },
+            "severity_trends": [
+                {"time": to_clock(time), "severity": SEVERITY_LEVELS[level]}
+                for time, level, _ in self.severity.points(since)
+            ],
+            "symptom_timeline": [
+                {"time": to_clock(time), "symptom": self.symptoms[symptom]}
+                for time, symptom, _ in self.timeline.points(since)
+            ],
+        }
+
+    def to_dict(self):
+        return {
+            "capacity": self.timeline.capacity,
+            "version": self.version,
+            "symptom_counts": self.symptom_counts,
+            "count_versions": self.count_versions,
+            "severity": self.severity.to_dict(),
+            "timeline": self.timeline.to_dict(),
+            "symptoms": self.symptoms,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        store = cls(data["capacity"])
+        store.version = data["version"]
+        store.symptom_counts = data["symptom_counts"]
+        store.count_versions = data["count_versions"]
+        store.severity.load(data["severity"])
+        store.timeline.load(data["timeline"])
+        store.symptoms = data["symptoms"]
+        store.symptom_ids = {symptom: i for i, symptom in enumerate(store.symptoms)}
+        return store
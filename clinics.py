@@ -0,0 +1,219 @@
+import csv
+import html
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import quote_plus
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Diagnosis keywords -> specialty, first match wins. Anything else goes to
+# general practice, which is also used to top up a short specialist list.
+# Keywords are regular expressions matched at the start of a word, optionally
+# after one of MEDICAL_PREFIXES (so "thyroid" also finds hypothyroidism).
+SPECIALTY_KEYWORDS = [
+    ("oncology", ("cancer", "carcinoma", "lymphoma", "leukemia", "leukaemia", "tumor", "tumour")),
+    ("obstetrics", ("pregnan", "preeclampsia", "eclampsia")),
+    ("cardiology", ("heart", "cardi", "myocard", "angina", "arrhythm", "fibrillation", "hypertension", "coronary")),
+    ("pulmonology", ("asthma", "pneumonia", "bronch", "tuberculosis", "lung", "copd", "pulmonary", "respiratory")),
+    ("neurology", ("stroke", "epilep", "seizure", "migraine", "neuro", "parkinson", "dementia", "mening", "encephal")),
+    ("endocrinology", ("diabet", "thyroid", "glycemia", "glycaemia", "obesity")),
+    ("gastroenterology", ("gastr", "colitis", "hepat", "cirrhosis", "pancrea", "ulcer", "bowel", "cholecyst", "crohn")),
+    ("nephrology", ("kidney", "renal", "nephr", "urinary", "cystitis", "pyelo")),
+    ("infectious_disease", ("dengue", "malaria", "typhoid", "cholera", "chikungunya", "covid", "sepsis")),
+    ("rheumatology", ("rheumat", "gout", "lupus")),
+    ("orthopedics", ("fracture", "arthritis", "sprain", "osteo", "sciatica", "tendin", "bursitis", "back pain")),
+    ("dermatology", ("dermat", "eczema", "psoria", "urticaria", "acne", "rash", "scabies", "cellulitis")),
+    ("ent", ("sinus", "pharyng", "tonsil", "laryng", "otitis", r"ears?\b", "earache")),
+    ("ophthalmology", ("conjunctiv", "glaucoma", "cataract", "eye")),
+    ("psychiatry", ("depress", "anxiety", "bipolar", "schizo", "psych")),
+]
+MEDICAL_PREFIXES = ("hypo", "hyper", "endo", "peri", "myo", "poly", "glomerulo", "rhino", "osteo")
+
+SPECIALTY_PATTERNS = [
+    (specialty, re.compile(rf"\b(?:{'|'.join(MEDICAL_PREFIXES)})?(?:{'|'.join(keywords)})"))
+    for specialty, keywords in SPECIALTY_KEYWORDS
+]
+
+
+def specialty_for(diagnosis):
+    text = (diagnosis or "").lower()
+    for specialty, pattern in SPECIALTY_PATTERNS:
+        if pattern.search(text):
+            return specialty
+    return "general"
+
+
+def geohash(latitude, longitude, precision=6):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    cell, bits, value, even = "", 0, 0, True
+    while len(cell) < precision:
+        bounds, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            cell += GEOHASH_ALPHABET[value]
+            bits, value = 0, 0
+    return cell
+
+
+def geohash_center(cell):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if value >> shift & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def unit_vectors(latitudes, longitudes):
+    # Points on the unit sphere, so Euclidean nearest neighbours are also the
+    # nearest by great-circle distance.
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(math.pi / 2, km / (2 * EARTH_RADIUS_KM)))
+
+
+def read_clinics(path):
+    # CSV with columns name, address, phone, latitude, longitude and
+    # specialties (separated by ";"), or a JSON list of objects with the
+    # same keys where specialties may also be a list.
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = json.load(f) if path.lower().endswith(".json") else list(csv.DictReader(f))
+    clinics = []
+    for row in rows:
+        specialties = row.get("specialties") or "general"
+        if isinstance(specialties, str):
+            specialties = specialties.split(";")
+        clinics.append({
+            "name": row["name"].strip(),
+            "address": (row.get("address") or "").strip(),
+            "phone": (row.get("phone") or "").strip(),
+            "latitude": float(row["latitude"]),
+            "longitude": float(row["longitude"]),
+            "specialties": {specialty.strip().lower() for specialty in specialties if specialty.strip()},
+        })
+    return clinics
+
+
+class ClinicDirectory:
+    # Clinics split by specialty, each group in its own KD-tree. Lookups are
+    # made from the centre of the patient's geohash cell (about 1.2 x 0.6 km
+    # at precision 6), so every fix in a cell shares one cached answer.
+    def __init__(self, clinics, cell_precision=6, k=5, max_km=50, max_entries=4096):
+        self.clinics = clinics
+        self.cell_precision = cell_precision
+        self.k = k
+        self.max_chord = km_to_chord(max_km)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        groups = {}
+        for index, clinic in enumerate(clinics):
+            for specialty in clinic["specialties"]:
+                groups.setdefault(specialty, []).append(index)
+        self.trees = {}
+        for specialty, indices in groups.items():
+            points = unit_vectors([clinics[i]["latitude"] for i in indices], [clinics[i]["longitude"] for i in indices])
+            self.trees[specialty] = (cKDTree(points), indices)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        return cls(read_clinics(path), **kwargs)
+
+    def _query(self, specialty, point, k):
+        if specialty not in self.trees or k <= 0:
+            return []
+        tree, indices = self.trees[specialty]
+        distances, positions = tree.query(point, k=min(k, len(indices)), distance_upper_bound=self.max_chord)
+        return [
+            (indices[position], distance)
+            for distance, position in zip(np.atleast_1d(distances), np.atleast_1d(positions))
+            if position < len(indices)
+        ]
+
+    def nearest(self, latitude, longitude, specialty, k=None):
+        # Up to k (clinic, km) pairs within max_km, specialists first and then
+        # general practice if there are fewer than k of them.
+        k = k or self.k
+        point = unit_vector(latitude, longitude)
+        found = self._query(specialty, point, k)
+        if len(found) < k and specialty != "general":
+            seen = {index for index, _ in found}
+            found += [item for item in self._query("general", point, k + len(found)) if item[0] not in seen][:k - len(found)]
+        return [(self.clinics[index], chord_to_km(distance)) for index, distance in found]
+
+    def suggestions_html(self, location, diagnosis):
+        try:
+            latitude, longitude = float(location["latitude"]), float(location["longitude"])
+        except (TypeError, KeyError, ValueError):
+            return '<p class="clinics-unavailable">Share your location to see nearby clinics.</p>'
+        cell = geohash(latitude, longitude, self.cell_precision)
+        key = (cell, specialty_for(diagnosis))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        rendered = render_clinics(self.nearest(*geohash_center(cell), key[1]))
+        with self.lock:
+            self.cache[key] = rendered
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return rendered
+
+    def stats(self):
+        with self.lock:
+            return {"clinics": len(self.clinics), "cached_cells": len(self.cache), "hits": self.hits, "misses": self.misses}
+
+
+def render_clinics(results):
+    # Same shape as the LeMUR answer it replaces: name, address, contact and a
+    # "Get Directions" link per clinic.
+    if not results:
+        return '<ul><li>No clinics found nearby.</li></ul>'
+    items = []
+    for clinic, km in results:
+        details = " - ".join(html.escape(part) for part in (clinic["name"], clinic["address"], clinic["phone"]) if part)
+        query = quote_plus(clinic["address"] or clinic["name"])
+        items.append(
+            f'<li>{details} ({km:.1f} km) '
+            f'<a href="https://www.google.com/maps/search/?api=1&amp;query={query}" target="_blank">Get Directions</a></li>'
+        )
+    return "<ul>" + "".join(items) + "</ul>"
@@ -0,0 +1,122 @@
+import json
+from html.parser import HTMLParser
+
+CATEGORIES = ("phi", "medical_history", "anatomy", "medication", "tests", "diagnosis", "severity")
+
+# Inline styles the formatting prompts ask LeMUR to use, compared with all
+# whitespace removed so "color:red" and "color: red ;" both match.
+SPAN_STYLES = {
+    "color:red": "phi",
+    "background-color:lightgreen": "medical_history",
+    "background-color:yellow": "medication",
+    "color:darkblue": "tests",
+    "color:blue": "diagnosis",
+}
+
+
+# Elements that never get an end tag.
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+def _category(tag, attrs):
+    attrs = dict(attrs)
+    if tag == "em":
+        return "anatomy"
+    if tag != "span":
+        return None
+    if "severity" in (attrs.get("class") or "").split():
+        return "severity"
+    style = "".join((attrs.get("style") or "").split()).lower().rstrip(";")
+    return SPAN_STYLES.get(style)
+
+
+class _EntityParser(HTMLParser):
+    # stack holds every open element so end tags pair up correctly; only the
+    # open elements that have a category collect text.
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.collecting = []
+        self.found = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        category = _category(tag, attrs)
+        line, column = self.getpos()
+        entry = (tag, category, self.line_offsets[line - 1] + column, [])
+        self.stack.append(entry)
+        if category:
+            self.collecting.append(entry)
+
+    def handle_endtag(self, tag):
+        # Pop up to the matching open tag so unclosed inner tags do not leak.
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                for entry in reversed(self.stack[i:]):
+                    _, category, offset, parts = entry
+                    if not category:
+                        continue
+                    self.collecting.remove(entry)
+                    text = " ".join("".join(parts).split())
+                    if text:
+                        self.found.append((offset, category, text))
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        for _, _, _, parts in self.collecting:
+            parts.append(data)
+
+    def parse(self, html):
+        self.line_offsets = [0]
+        for line in html.splitlines(keepends=True):
+            self.line_offsets.append(self.line_offsets[-1] + len(line))
+        self.feed(html)
+        self.close()
+        self.found.sort()
+        return [(category, text, offset) for offset, category, text in self.found]
+
+
+def parse_entities(html):
+    # Returns (category, text, offset) tuples in document order.
+    return _EntityParser().parse(html)
+
+
+class EntityIndex:
+    # Category -> ordered, de-duplicated entities, each remembering the report
+    # segment it first appeared in and its character offset within it.
+    def __init__(self):
+        self.entries = {category: [] for category in CATEGORIES}
+        self.seen = {category: set() for category in CATEGORIES}
+        self.segment_count = 0
+
+    def add(self, html, entities=None):
+        # entities, if given, is parse_entities(html) computed earlier.
+        segment = self.segment_count
+        self.segment_count += 1
+        for category, text, offset in parse_entities(html) if entities is None else entities:
+            key = text.lower()
+            if key in self.seen[category]:
+                continue
+            self.seen[category].add(key)
+            self.entries[category].append({"text": text, "segment": segment, "offset": offset})
+        return segment
+
+    def texts(self, category):
+        return [entry["text"] for entry in self.entries[category]]
+
+    def to_dict(self):
+        return {"segment_count": self.segment_count, "entries": self.entries}
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        index.segment_count = data["segment_count"]
+        for category, entries in data["entries"].items():
+            index.entries[category] = list(entries)
+            index.seen[category] = {entry["text"].lower() for entry in entries}
+        return index
@@ -0,0 +1,148 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def cache_key(prompt, input_text, model):
+    digest = hashlib.sha256()
+    for part in (prompt, input_text, str(model)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LemurCache:
+    # In-memory LRU with per-entry TTL, backed by an optional sqlite file so
+    # answers survive restarts. Identical requests that arrive while one is
+    # already in flight wait for that request instead of issuing their own.
+    # self.lock only guards the in-memory state; sqlite is read and written by
+    # the request that owns the key, under db_lock. Every purge_every writes,
+    # expired rows are deleted and the file is trimmed to max_disk_entries.
+    def __init__(self, max_entries=512, ttl=24 * 3600, path=None, max_disk_entries=20000, purge_every=200):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.purge_every = purge_every
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.db = None
+        self.db_lock = threading.Lock()
+        self.writes = 0
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS lemur_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+            self._purge()
+
+    def get_or_compute(self, key, compute, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            with self.lock:
+                self.misses += 1
+            return compute()
+
+        with self.lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            row = self._load(key)
+            if row is not None:
+                value, expires_at = row
+            else:
+                value, expires_at = compute(), time.time() + ttl
+        except Exception as e:
+            with self.lock:
+                self.misses += 1
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            if row is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self._remember(key, value, expires_at)
+            del self.inflight[key]
+        future.set_result(value)
+        if row is None:
+            self._save(key, value, expires_at)
+        return value
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+        return None
+
+    def _remember(self, key, value, expires_at):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self, key):
+        if self.db is None:
+            return None
+        try:
+            with self.db_lock:
+                row = self.db.execute("SELECT value, expires_at FROM lemur_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print("LeMUR cache read failed:", e)
+            return None
+        return row if row and row[1] > time.time() else None
+
+    def _save(self, key, value, expires_at):
+        if self.db is None:
+            return
+        try:
+            with self.db_lock:
+                self.db.execute("INSERT OR REPLACE INTO lemur_cache VALUES (?, ?, ?)", (key, value, expires_at))
+                self.db.commit()
+                self.writes += 1
+                if self.writes % self.purge_every == 0:
+                    self._purge()
+        except sqlite3.Error as e:
+            print("LeMUR cache write failed:", e)
+
+    def _purge(self):
+        # Expired rows first, then the soonest to expire beyond the size cap.
+        self.db.execute("DELETE FROM lemur_cache WHERE expires_at <= ?", (time.time(),))
+        self.db.execute(
+            "DELETE FROM lemur_cache WHERE key IN "
+            "(SELECT key FROM lemur_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+        self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "inflight": len(self.inflight),
+            }
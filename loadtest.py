@@ -0,0 +1,96 @@
+import argparse
+import threading
+import time
+
+import app
+
+
+class LocalRedis:
+    # In-process stand-in for redis.Redis, enough for RedisBackend.
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self.data[key] = value
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+def fake_lemur_task(latency):
+    # Echoes each utterance back so cross-talk between sessions is visible.
+    def task(prompt, input_text, ttl=None, **labels):
+        time.sleep(latency)
+        if prompt is app.base_prompt:
+            return f'{input_text} <span style="color: blue;">diagnosis for {input_text}</span>'
+        if prompt.startswith("You are an assistant"):
+            return '{"symptom_counts": {}}'
+        if "severity" in prompt:
+            return f'<span class="severity">Severity: LOW - {input_text}</span>'
+        return f"<ul><li>{input_text}</li></ul>"
+    return task
+
+
+def run_session(index, utterances, failures):
+    client = app.app.test_client()
+    client.get('/')
+    with client.session_transaction() as flask_session:
+        consultation_id = flask_session['consultation_id']
+    socket = app.socketio.test_client(app.app, flask_test_client=client)
+    tag = f"session-{index}-"
+    for n in range(utterances):
+        app.analyze_transcript(consultation_id, f"{tag} utterance {n}.")
+
+    received = socket.get_received()
+    if sum(event["name"] == "formatted_transcript" for event in received) != utterances:
+        failures.append(f"{tag} did not receive all of its formatted_transcript events")
+    for event in received:
+        for arg in event["args"]:
+            if "text" in arg and tag not in arg["text"]:
+                failures.append(f"{tag} received {event['name']}: {arg}")
+    report = client.get('/report').get_data(as_text=True)
+    if report.count(f"diagnosis for {tag}") < utterances:
+        failures.append(f"{tag} report is missing utterances")
+    if report.count("diagnosis for session-") != report.count(f"diagnosis for {tag}"):
+        failures.append(f"{tag} report contains other sessions")
+    socket.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run parallel consultations and check for cross-talk.")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--utterances", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated LeMUR latency in seconds")
+    parser.add_argument("--shared", action="store_true", help="use RedisBackend with an in-process stand-in")
+    args = parser.parse_args()
+
+    app.lemur_task = fake_lemur_task(args.latency)
+    if args.shared:
+        app.consultations = app.SessionStore(app.RedisBackend(client=LocalRedis()))
+
+    failures = []
+    threads = [threading.Thread(target=run_session, args=(i, args.utterances, failures)) for i in range(args.sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.sessions} sessions x {args.utterances} utterances in {elapsed:.2f}s")
+    for failure in failures:
+        print("FAIL:", failure)
+    if failures:
+        raise SystemExit(1)
+    print("No cross-talk detected")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import bisect
+import json
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a socket emit up to a slow LeMUR call.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        # Prometheus text exposition format.
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                print(f"Metric {metric.name} failed:", e)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    # function, if given, is called at scrape time and returns the value, or a
+    # dict of {label values tuple: value} for labelled metrics.
+    def __init__(self, name, help, labels=(), function=None, registry=registry):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.function = function
+        self.lock = threading.Lock()
+        self.values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            values = value if isinstance(value, dict) else {(): value}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=registry):
+        super().__init__(name, help, labels, registry=registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then sum and count.
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Trace:
+    # One per final utterance (or re-analysis request): an id that ties its
+    # log lines together and the time it arrived, for end-to-end latencies.
+    def __init__(self, consultation_id):
+        self.id = uuid.uuid4().hex[:16]
+        self.consultation_id = consultation_id
+        self.started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+class Tracer:
+    # Times named spans into a histogram and, when a log path is given,
+    # writes one JSON line per span or event ("-" logs to stdout).
+    def __init__(self, log_path=None, registry=registry):
+        self.spans = Histogram("pipeline_span_seconds", "Time spent in each traced step.", labels=("span",), registry=registry)
+        self.errors = Counter("pipeline_span_errors_total", "Traced steps that raised.", labels=("span",), registry=registry)
+        self.lock = threading.Lock()
+        self.log = None
+        if log_path == "-":
+            self.log = sys.stdout
+        elif log_path:
+            self.log = open(log_path, "a", encoding="utf-8")
+
+    def start(self, consultation_id):
+        trace = Trace(consultation_id)
+        self.event(trace, "trace_start")
+        return trace
+
+    @contextmanager
+    def span(self, trace, name, **fields):
+        started = time.monotonic()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            self.errors.inc(span=name)
+            raise
+        finally:
+            self.record(trace, name, time.monotonic() - started, status, **fields)
+
+    def record(self, trace, name, seconds, status="ok", **fields):
+        # For steps timed elsewhere, such as time spent queued.
+        self.spans.observe(seconds, span=name)
+        if self.log is not None:
+            self.event(trace, "span", span=name, seconds=round(seconds, 6), status=status, **fields)
+
+    def event(self, trace, kind, **fields):
+        if self.log is None:
+            return
+        record = {"ts": round(time.time(), 6), "event": kind}
+        if trace is not None:
+            record["trace"] = trace.id
+            record["consultation"] = trace.consultation_id
+        record.update(fields)
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            self.log.write(line)
+            self.log.flush()
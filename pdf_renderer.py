@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+# Set by report.html in pdf_mode once the page has loaded and its charts are
+# drawn, or once it has loaded where they cannot be (wkhtmltopdf).
+READY_FLAG = "charts-rendered"
+
+
+class ChromiumRenderer:
+    # One headless Chromium kept alive on a private event loop thread, with at
+    # most max_pages tabs rendering at once. Report HTML is loaded with
+    # setContent, so nothing is fetched back from this server except static
+    # assets resolved against base_url.
+    def __init__(self, executable_path=None, max_pages=2, timeout=15):
+        self.executable_path = executable_path
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="pdf-renderer", daemon=True)
+        self.thread.start()
+        self.browser = None
+        self.idle_pages = []
+        self.semaphore = None
+
+    async def _page(self):
+        from pyppeteer import launch
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_pages)
+        await self.semaphore.acquire()
+        try:
+            if self.browser is None:
+                options = {'args': ['--no-sandbox']}
+                if self.executable_path:
+                    options['executablePath'] = self.executable_path
+                self.browser = await launch(**options)
+                self.idle_pages = []
+            if self.idle_pages:
+                return self.idle_pages.pop()
+            return await self.browser.newPage()
+        except Exception:
+            self.semaphore.release()
+            raise
+
+    async def _render(self, html):
+        page = await self._page()
+        try:
+            await page.setContent(html)
+            await page.waitForFunction(f"window.status === '{READY_FLAG}'", {'timeout': self.timeout * 1000})
+            pdf_bytes = await page.pdf({'format': 'A4', 'printBackground': True})
+            self.idle_pages.append(page)
+            return pdf_bytes
+        except Exception:
+            # Drop only this tab; the browser is shared by every other render
+            # and is replaced only once it has actually gone away.
+            try:
+                await page.close()
+            except Exception:
+                pass
+            if self._browser_died():
+                browser, self.browser, self.idle_pages = self.browser, None, []
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+            raise
+        finally:
+            self.semaphore.release()
+
+    def _browser_died(self):
+        if self.browser is None:
+            return False
+        process = self.browser.process
+        return process is not None and process.poll() is not None
+
+    def render(self, html):
+        future = asyncio.run_coroutine_threadsafe(self._render(html), self.loop)
+        return future.result(self.timeout * 2)
+
+
+class WkhtmltopdfRenderer:
+    # Lighter-weight fallback; wkhtmltopdf waits for the same readiness flag
+    # through --window-status. That wait has no limit of its own, so the
+    # process is killed after timeout seconds.
+    def __init__(self, wkhtmltopdf_path=None, timeout=30):
+        self.wkhtmltopdf_path = wkhtmltopdf_path or shutil.which("wkhtmltopdf") or "wkhtmltopdf"
+        self.timeout = timeout
+        self.options = [
+            "--quiet",
+            "--enable-local-file-access",
+            "--window-status", READY_FLAG,
+            "--page-size", "A4",
+            "--print-media-type",
+        ]
+
+    def render(self, html):
+        result = subprocess.run(
+            [self.wkhtmltopdf_path, *self.options, "-", "-"],
+            input=html.encode("utf-8"),
+            capture_output=True,
+            timeout=self.timeout,
+        )
+        if result.returncode != 0 or not result.stdout:
+            raise RuntimeError(f"wkhtmltopdf exited with {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+
+
+def state_key(state):
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    # Rendered PDFs keyed by a hash of the report state they were made from;
+    # the report HTML is only built on a miss.
+    def __init__(self, renderer, max_entries=32):
+        self.renderer = renderer
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def render(self, state, make_html):
+        key = state_key(state)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        pdf_bytes = self.renderer.render(make_html())
+        with self.lock:
+            self.entries[key] = pdf_bytes
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return pdf_bytes
@@ -0,0 +1,100 @@
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+# Called as hook(stage_name, seconds, status) when a stage finishes, with
+# status one of "ok", "failed" or "timeout". Seconds run from submission to
+# completion, so they include any wait for a free worker.
+timing_hooks = []
+
+# How often run_stages checks whether a queued stage has started running.
+START_POLL_SECONDS = 0.05
+
+
+def _report_timing(stage, started, status):
+    seconds = time.monotonic() - started
+    for hook in timing_hooks:
+        try:
+            hook(stage.name, seconds, status)
+        except Exception as e:
+            print("Timing hook failed:", e)
+
+
+def _timed(func, inputs, started):
+    # Runs on the worker; the stage's timeout counts from here, not from
+    # submission, so time spent queued for a free worker is not held against it.
+    started.append(time.monotonic())
+    return func(inputs)
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), timeout=60, on_result=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.on_result = on_result
+
+
+def run_stages(stages, pool):
+    # Stages run on pool, which the caller sizes and shares between runs.
+    # Each stage starts as soon as all of its dependencies have finished, and
+    # receives their results as a dict. A stage whose dependency failed, timed
+    # out or returned None is skipped and its own result is None.
+    # on_result callbacks run on the calling thread, in completion order.
+    # A timed-out stage is abandoned, but a running one keeps its worker until
+    # it returns: threads cannot be interrupted.
+    seen = set()
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in seen:
+                raise ValueError(f"Stage {stage.name} depends on {dep}, which is not declared before it")
+        seen.add(stage.name)
+
+    results = {}
+    pending = list(stages)
+    running = {}
+    while pending or running:
+        running_names = {stage.name for stage, _, _ in running.values()}
+        for stage in list(pending):
+            if any(dep in running_names or dep not in results for dep in stage.deps):
+                continue
+            pending.remove(stage)
+            if any(results[dep] is None for dep in stage.deps):
+                results[stage.name] = None
+                continue
+            inputs = {dep: results[dep] for dep in stage.deps}
+            started = []
+            future = pool.submit(_timed, stage.func, inputs, started)
+            running[future] = (stage, time.monotonic(), started)
+            running_names.add(stage.name)
+        if not running:
+            continue
+
+        deadlines = [started[0] + stage.timeout for stage, _, started in running.values() if started]
+        if len(deadlines) < len(running):
+            deadlines.append(time.monotonic() + START_POLL_SECONDS)
+        done, _ = wait(running, timeout=max(0, min(deadlines) - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            stage, submitted, _ = running.pop(future)
+            try:
+                results[stage.name] = future.result()
+            except Exception as e:
+                print(f"Stage {stage.name} failed:", e)
+                _report_timing(stage, submitted, "failed")
+                results[stage.name] = None
+                continue
+            _report_timing(stage, submitted, "ok")
+            if stage.on_result and results[stage.name] is not None:
+                try:
+                    stage.on_result(results[stage.name])
+                except Exception as e:
+                    print(f"Stage {stage.name} callback failed:", e)
+
+        now = time.monotonic()
+        for future, (stage, submitted, started) in list(running.items()):
+            if started and started[0] + stage.timeout <= now:
+                del running[future]
+                print(f"Stage {stage.name} timed out after {stage.timeout}s")
+                _report_timing(stage, submitted, "timeout")
+                results[stage.name] = None
+    return results
@@ -0,0 +1,131 @@
+import json
+import random
+import re
+import threading
+import time
+
+from lemur_cache import cache_key
+
+# Recordings are JSONL files with one event per line:
+#   {"type": "transcript", "consultation": <id>, "t": <seconds>, "text": <final transcript>}
+#   {"type": "lemur", "key": <cache_key>, "prompt": ..., "input_text": ..., "model": ...,
+#    "response": <LeMUR response text>, "latency": <seconds>}
+# "t" is relative to the start of the recording.
+
+
+class SessionRecorder:
+    # Appends final transcripts and LeMUR round trips from a live server to a
+    # JSONL recording that bench_replay.py can play back offline.
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _write(self, event):
+        with self.lock:
+            self.file.write(json.dumps(event) + "\n")
+            self.file.flush()
+
+    def transcript(self, consultation_id, text):
+        self._write({
+            "type": "transcript",
+            "consultation": consultation_id,
+            "t": round(time.monotonic() - self.started, 3),
+            "text": text,
+        })
+
+    def lemur(self, prompt, input_text, model, response, latency):
+        self._write({
+            "type": "lemur",
+            "key": cache_key(prompt, input_text, model),
+            "prompt": prompt,
+            "input_text": input_text,
+            "model": str(model),
+            "response": response,
+            "latency": round(latency, 3),
+        })
+
+
+def load_recording(path):
+    # Returns ({consultation: [transcript events]}, {cache_key: lemur event}).
+    transcripts = {}
+    responses = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "transcript":
+                transcripts.setdefault(event["consultation"], []).append(event)
+            elif event["type"] == "lemur":
+                responses[event["key"]] = event
+    return transcripts, responses
+
+
+class StubResult:
+    def __init__(self, response):
+        self.response = response
+
+
+class StubLemur:
+    # Drop-in for aai.Lemur(): task() answers from recorded responses when it
+    # has one for the exact (prompt, input, model), and otherwise synthesizes a
+    # plausible answer. Latency is the recorded one, or latency +/- jitter.
+    def __init__(self, responses=None, latency=0.5, jitter=0.2, use_recorded_latency=True, seed=None):
+        self.responses = responses or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.use_recorded_latency = use_recorded_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.recorded_hits = 0
+
+    def __call__(self):
+        return self
+
+    def task(self, prompt, input_text=None, final_model=None, **kwargs):
+        recorded = self.responses.get(cache_key(prompt, input_text, final_model))
+        with self.lock:
+            self.calls += 1
+            if recorded:
+                self.recorded_hits += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if recorded:
+            if self.use_recorded_latency:
+                delay = recorded["latency"]
+            time.sleep(delay)
+            return StubResult(recorded["response"])
+        time.sleep(delay)
+        return StubResult(synthesize_response(prompt, input_text or ""))
+
+
+SYMPTOMS = ("fever", "cough", "headache", "nausea", "dizziness", "pain", "fatigue", "rash")
+
+
+def synthesize_response(prompt, input_text):
+    # Answers shaped like the app's prompts expect, derived from the input.
+    if prompt.startswith("You are an assistant that extracts structured data"):
+        lowered = prompt.lower()
+        counts = {symptom: lowered.count(symptom) for symptom in SYMPTOMS if symptom in lowered}
+        now = time.strftime("%H:%M:%S")
+        return json.dumps({
+            "symptom_counts": counts,
+            "severity_trends": [{"time": now, "severity": "MODERATE"}],
+            "symptom_timeline": [{"time": now, "symptom": symptom} for symptom in counts],
+        })
+    if prompt.startswith("You are a medical transcript analyzer"):
+        text = input_text
+        for symptom in SYMPTOMS:
+            text = re.sub(rf'\b{symptom}\b', f'<span style="background-color: lightgreen;">{symptom}</span>', text)
+        diagnosis = "viral fever" if "fever" in input_text.lower() else "common cold"
+        return f'{text}\n<span style="color: blue;">{diagnosis}</span>'
+    if "severity" in prompt:
+        return '<span class="severity">Severity: MODERATE - Monitor your symptoms and consider consulting a doctor.</span>'
+    if "precautions" in prompt:
+        return f'<div class="precautions"><ul><li>Rest well with {input_text}</li><li>Stay hydrated</li></ul></div>'
+    if "clinics" in prompt:
+        return '<ul><li>City Clinic - 1 Main Street - 555-0100 <a href="https://www.google.com/maps/search/?api=1&query=1+Main+Street" target="_blank">Get Directions</a></li></ul>'
+    if "correction suggestions" in prompt:
+        return '["fever", "favour", "flavor"]'
+    return input_text
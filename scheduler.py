@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+
+
+class Job:
+    def __init__(self, consultation_id, text, trace=None):
+        self.consultation_id = consultation_id
+        self.texts = [text]
+        self.traces = [trace] if trace is not None else []
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def text(self):
+        return " ".join(self.texts)
+
+
+class AnalysisScheduler:
+    # Bounded queue of analysis jobs served by a fixed set of worker threads.
+    # A consultation never has more than one job running, so its utterances
+    # are analyzed in order. While a job is still waiting, later utterances of
+    # the same consultation are merged into it, until it has waited
+    # max_latency seconds; after that it is left alone so it runs promptly.
+    # When the queue is full, submit waits up to put_timeout for space and
+    # then drops the utterance. Traces of merged utterances are passed to the
+    # handler together, as handler(consultation_id, text, traces=[...]).
+    def __init__(self, handler, workers=2, max_queue=32, max_latency=2.0, put_timeout=0.5):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_latency = max_latency
+        self.put_timeout = put_timeout
+        self.queue = deque()
+        self.active = set()
+        self.condition = threading.Condition()
+        self.threads = []
+        self.submitted = 0
+        self.merged = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        with self.condition:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"analysis-{len(self.threads)}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def submit(self, consultation_id, text, trace=None):
+        self.start()
+        deadline = time.monotonic() + self.put_timeout
+        with self.condition:
+            self.submitted += 1
+            while True:
+                job = self._last_queued(consultation_id)
+                full = len(self.queue) >= self.max_queue
+                if job and (full or time.monotonic() - job.enqueued_at < self.max_latency):
+                    job.texts.append(text)
+                    if trace is not None:
+                        job.traces.append(trace)
+                    self.merged += 1
+                    return True
+                if not full:
+                    self.queue.append(Job(consultation_id, text, trace))
+                    self.condition.notify_all()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.dropped += 1
+                    print("Analysis queue full, dropping utterance for", consultation_id)
+                    return False
+                self.condition.wait(remaining)
+
+    def _last_queued(self, consultation_id):
+        for job in reversed(self.queue):
+            if job.consultation_id == consultation_id:
+                return job
+        return None
+
+    def _next_job(self):
+        with self.condition:
+            while True:
+                for job in self.queue:
+                    if job.consultation_id not in self.active:
+                        self.queue.remove(job)
+                        self.active.add(job.consultation_id)
+                        waited = time.monotonic() - job.enqueued_at
+                        self.wait_total += waited
+                        self.wait_max = max(self.wait_max, waited)
+                        self.condition.notify_all()
+                        return job
+                self.condition.wait()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            try:
+                self.handler(job.consultation_id, job.text, traces=job.traces)
+            except Exception as e:
+                print("Analysis job failed:", e)
+                with self.condition:
+                    self.failed += 1
+            finally:
+                with self.condition:
+                    self.active.discard(job.consultation_id)
+                    self.processed += 1
+                    self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            started = self.processed + len(self.active)
+            return {
+                "queue_depth": len(self.queue),
+                "running": len(self.active),
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "merged": self.merged,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "failed": self.failed,
+                "wait_seconds_avg": self.wait_total / started if started else 0.0,
+                "wait_seconds_max": self.wait_max,
+            }
@@ -0,0 +1,84 @@
+import re
+from difflib import SequenceMatcher
+
+from entities import parse_entities
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def normalize(sentence):
+    return " ".join(sentence.split()).lower()
+
+
+class Segment:
+    # entities is parse_entities(formatted); it is parsed once, when the
+    # segment is formatted, and kept so unchanged segments are never re-parsed.
+    def __init__(self, text, formatted, entities=None):
+        self.text = text
+        self.formatted = formatted
+        self.entities = parse_entities(formatted) if entities is None else entities
+
+
+class SegmentStore:
+    # Formatted output of the last analyzed transcript, one entry per analyzed
+    # chunk (a live utterance or a re-formatted run of edited sentences), plus
+    # the diagnosis and downstream HTML that were derived from it.
+    def __init__(self):
+        self.segments = []
+        self.diagnosis = None
+        self.downstream = {}
+
+    def append(self, segment):
+        self.segments.append(segment)
+
+    def plan(self, text):
+        # Diffs the new text against the stored segments sentence by sentence.
+        # Returns an ordered list whose items are either a stored Segment that
+        # can be reused as is, or a str run of new/edited sentences that needs
+        # formatting.
+        new = split_sentences(text)
+        old = [(index, sentence) for index, segment in enumerate(self.segments)
+               for sentence in split_sentences(segment.text)]
+        matcher = SequenceMatcher(
+            a=[normalize(s) for _, s in old],
+            b=[normalize(s) for s in new],
+            autojunk=False
+        )
+        new_pos = {}
+        for block in matcher.get_matching_blocks():
+            for offset in range(block.size):
+                new_pos[block.a + offset] = block.b + offset
+
+        reusable = {}
+        position = 0
+        for index, segment in enumerate(self.segments):
+            count = len(split_sentences(segment.text))
+            mapped = [new_pos.get(position + offset) for offset in range(count)]
+            position += count
+            if count and None not in mapped and mapped == list(range(mapped[0], mapped[0] + count)):
+                reusable[mapped[0]] = (segment, count)
+
+        parts = []
+        run = []
+        j = 0
+        while j < len(new):
+            if j in reusable:
+                if run:
+                    parts.append(" ".join(run))
+                    run = []
+                segment, count = reusable[j]
+                parts.append(segment)
+                j += count
+            else:
+                run.append(new[j])
+                j += 1
+        if run:
+            parts.append(" ".join(run))
+        return parts
+
+    def replace(self, segments):
+        self.segments = list(segments)
@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from chart_store import ChartStore
+from entities import EntityIndex
+from segments import Segment, SegmentStore
+
+
+class Consultation:
+    # Written only by analyses; see SessionStore.analysis.
+    ANALYSIS_FIELDS = ("report_transcript", "segments", "entities", "charts")
+
+    def __init__(self, consultation_id):
+        self.id = consultation_id
+        self.report_transcript = ""
+        self.segments = SegmentStore()
+        self.entities = EntityIndex()
+        self.current_language = "english"
+        self.charts = ChartStore()
+        self.user_location = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "report_transcript": self.report_transcript,
+            "segments": [[s.text, s.formatted, s.entities] for s in self.segments.segments],
+            "diagnosis": self.segments.diagnosis,
+            "downstream": self.segments.downstream,
+            "entities": self.entities.to_dict(),
+            "current_language": self.current_language,
+            "charts": self.charts.to_dict(),
+            "user_location": self.user_location,
+        }
+
+    def apply_analysis(self, analyzed):
+        for field in self.ANALYSIS_FIELDS:
+            setattr(self, field, getattr(analyzed, field))
+
+    @classmethod
+    def from_dict(cls, data):
+        consultation = cls(data["id"])
+        consultation.report_transcript = data["report_transcript"]
+        consultation.segments.replace(Segment(*segment) for segment in data["segments"])
+        consultation.segments.diagnosis = data["diagnosis"]
+        consultation.segments.downstream = data["downstream"]
+        consultation.entities = EntityIndex.from_dict(data["entities"])
+        consultation.current_language = data["current_language"]
+        consultation.charts = ChartStore.from_dict(data["charts"])
+        consultation.user_location = data["user_location"]
+        return consultation
+
+
+class MemoryBackend:
+    # Keeps Consultation objects in a dict; only valid for a single process.
+    # Like RedisBackend, a consultation expires ttl seconds after it was last
+    # saved; expired ones are swept at most every sweep_interval seconds.
+    def __init__(self, ttl=12 * 3600, sweep_interval=60):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.consultations = {}  # id -> (consultation, expires_at)
+        self.lock = threading.Lock()
+        self.next_sweep = 0
+
+    def load(self, consultation_id):
+        with self.lock:
+            entry = self.consultations.get(consultation_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self.consultations[consultation_id]
+                return None
+            return entry[0]
+
+    def save(self, consultation):
+        now = time.monotonic()
+        with self.lock:
+            self.consultations[consultation.id] = (consultation, now + self.ttl)
+            if now >= self.next_sweep:
+                self.next_sweep = now + self.sweep_interval
+                for consultation_id, (_, expires_at) in list(self.consultations.items()):
+                    if expires_at <= now:
+                        del self.consultations[consultation_id]
+
+    def delete(self, consultation_id):
+        with self.lock:
+            self.consultations.pop(consultation_id, None)
+
+
+class RedisBackend:
+    # Stores consultations as JSON so every worker process sees the same state.
+    # Any client with get/set/delete (e.g. redis.Redis) can be passed in.
+    def __init__(self, client=None, url=None, prefix="consultation:", ttl=12 * 3600):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def load(self, consultation_id):
+        raw = self.client.get(self.prefix + consultation_id)
+        if raw is None:
+            return None
+        return Consultation.from_dict(json.loads(raw))
+
+    def save(self, consultation):
+        self.client.set(self.prefix + consultation.id, json.dumps(consultation.to_dict()), ex=self.ttl)
+
+    def delete(self, consultation_id):
+        self.client.delete(self.prefix + consultation_id)
+
+
+class SessionStore:
+    # Writes for a consultation come from the worker that owns its socket
+    # (socket.io requires sticky sessions), so a per-process lock is enough to
+    # serialize them; reads from any worker get the last saved snapshot.
+    # Locks of consultations not edited for idle_ttl seconds (by default the
+    # backend's ttl) are dropped along with the state.
+    def __init__(self, backend, idle_ttl=None, sweep_interval=60):
+        self.backend = backend
+        self.idle_ttl = idle_ttl or getattr(backend, "ttl", 12 * 3600)
+        self.sweep_interval = sweep_interval
+        self.locks = {}  # id -> (RLock, last used)
+        self.locks_lock = threading.Lock()
+        self.next_sweep = 0
+
+    def _lock(self, key):
+        now = time.monotonic()
+        with self.locks_lock:
+            entry = self.locks.get(key)
+            lock = entry[0] if entry else threading.RLock()
+            self.locks[key] = (lock, now)
+            if now >= self.next_sweep:
+                self.next_sweep = now + self.sweep_interval
+                for other, (_, used) in list(self.locks.items()):
+                    if now - used > self.idle_ttl:
+                        del self.locks[other]
+            return lock
+
+    def get(self, consultation_id):
+        return self.backend.load(consultation_id) or Consultation(consultation_id)
+
+    @contextmanager
+    def edit(self, consultation_id):
+        with self._lock(consultation_id):
+            consultation = self.get(consultation_id)
+            yield consultation
+            self.backend.save(consultation)
+
+    @contextmanager
+    def analysis(self, consultation_id):
+        # Analyses of a consultation run one at a time under their own lock,
+        # so the slow part does not block edit(). The analysis works on a
+        # private copy (MemoryBackend hands out the stored object itself, which
+        # readers such as the PDF download use), then copies
+        # Consultation.ANALYSIS_FIELDS onto the latest saved state under the
+        # edit lock; nothing else writes those fields.
+        with self._lock(("analysis", consultation_id)):
+            with self._lock(consultation_id):
+                analyzed = Consultation.from_dict(json.loads(json.dumps(self.get(consultation_id).to_dict())))
+            yield analyzed
+            with self.edit(consultation_id) as consultation:
+                consultation.apply_analysis(analyzed)
+
+    def delete(self, consultation_id):
+        with self._lock(consultation_id):
+            self.backend.delete(consultation_id)
+        with self.locks_lock:
+            self.locks.pop(consultation_id, None)
+            self.locks.pop(("analysis", consultation_id), None)
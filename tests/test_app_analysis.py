@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def lemur(monkeypatch):
+    # Diagnoses "flu" when anyone sneezes and "cold" otherwise, and records
+    # which downstream prompts were asked about which diagnosis.
+    calls = []
+
+    def diagnose(text):
+        return "flu" if "sneez" in text.lower() else "cold"
+
+    def task(prompt, input_text, ttl=None, task="other"):
+        calls.append((task, input_text))
+        if prompt is app.base_prompt:
+            return f'{input_text}\n<span style="color: blue;">{diagnose(input_text)}</span>'
+        if prompt is app.diagnosis_prompt:
+            return diagnose(input_text).upper()
+        if task == "graph":
+            return '{"symptom_counts": {}}'
+        if task == "severity":
+            return f'<span class="severity">Severity: LOW - {input_text}</span>'
+        return f"<p>{task} for {input_text}</p>"
+
+    monkeypatch.setattr(app, "lemur_task", task)
+    monkeypatch.setattr(app, "clinic_directory", None)
+    return calls
+
+
+def live_consultation(utterances):
+    consultation_id = uuid.uuid4().hex
+    for text in utterances:
+        app.analyze_transcript(consultation_id, text)
+    return consultation_id
+
+
+def test_editing_an_early_segment_updates_the_diagnosis(lemur):
+    consultation_id = live_consultation(["I have a cough.", "It started Monday.", "No fever."])
+    assert app.consultations.get(consultation_id).segments.diagnosis == "cold"
+
+    lemur.clear()
+    app.analyze_transcript(consultation_id, "I have a cough and keep sneezing. It started Monday. No fever.", reanalysis=True)
+    consultation = app.consultations.get(consultation_id)
+    assert consultation.segments.diagnosis == "FLU"
+    assert [task for task, _ in lemur].count("format") == 1
+    assert ("precautions", "FLU") in lemur
+    assert "precautions for FLU" in consultation.report_transcript
+    assert "precautions for cold" not in consultation.report_transcript
+
+
+def test_edit_with_the_same_diagnosis_reuses_downstream(lemur):
+    consultation_id = live_consultation(["I have a cough.", "It started Monday."])
+    lemur.clear()
+    app.analyze_transcript(consultation_id, "I have a bad cough. It started Monday.", reanalysis=True)
+    consultation = app.consultations.get(consultation_id)
+    assert consultation.segments.diagnosis == "cold"
+    assert not any(task in ("precautions", "severity", "clinic") for task, _ in lemur)
+    assert "precautions for cold" in consultation.report_transcript
+
+
+def test_reanalysis_without_edits_makes_no_calls_but_graph(lemur):
+    consultation_id = live_consultation(["I have a cough.", "It started Monday."])
+    lemur.clear()
+    app.analyze_transcript(consultation_id, "I have a cough. It started Monday.", reanalysis=True)
+    assert [task for task, _ in lemur] == ["graph"]
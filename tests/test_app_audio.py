@@ -0,0 +1,43 @@
+import app
+from audio_ingest import ReplayTranscriber
+
+
+def connect(client=None):
+    client = client or app.app.test_client()
+    client.get('/')
+    with client.session_transaction() as flask_session:
+        consultation_id = flask_session['consultation_id']
+    return client, consultation_id, app.socketio.test_client(app.app, flask_test_client=client)
+
+
+def test_other_socket_of_the_consultation_does_not_stop_the_stream(monkeypatch):
+    monkeypatch.setattr(app, "transcriber_factory", lambda consultation_id: ReplayTranscriber(on_data=lambda t: None))
+    client, consultation_id, owner = connect()
+    owner.emit('audio_start', {'sample_rate': 16000, 'format': 's16'})
+    assert consultation_id in app.audio_streams
+
+    _, _, other = connect(client)
+    other.emit('audio_chunk', b"\0\0" * 160)
+    other.emit('audio_stop')
+    other.disconnect()
+    assert consultation_id in app.audio_streams
+    assert app.audio_streams[consultation_id]["stream"].samples_in == 0
+
+    owner.emit('audio_chunk', b"\0\0" * 160)
+    assert app.audio_streams[consultation_id]["stream"].samples_in == 160
+    owner.disconnect()
+    assert consultation_id not in app.audio_streams
+
+
+def test_socket_without_session_cookie_is_ignored():
+    socket = app.socketio.test_client(app.app)
+    for event, payload in (
+        ('toggle_transcription', {'language': 'english'}),
+        ('audio_start', {'sample_rate': 16000}),
+        ('audio_chunk', b"\0\0"),
+        ('audio_stop', {}),
+        ('re_analyze_transcript', {'updated_transcript': 'I have a cough.'}),
+    ):
+        socket.emit(event, payload)
+    assert socket.is_connected()
+    socket.disconnect()
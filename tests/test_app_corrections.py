@@ -0,0 +1,37 @@
+import pytest
+
+import app
+from vocabulary import MedicalVocabulary
+
+
+@pytest.fixture
+def vocabulary(tmp_path, monkeypatch):
+    terms = tmp_path / "terms.csv"
+    terms.write_text("term,category\nparacetamol,medication\n", encoding="utf-8")
+    vocabulary = MedicalVocabulary(str(terms), learned_path=str(tmp_path / "learned.csv"))
+    monkeypatch.setattr(app, "medical_vocabulary", vocabulary)
+    return vocabulary
+
+
+def connect():
+    client = app.app.test_client()
+    client.get('/')
+    return app.socketio.test_client(app.app, flask_test_client=client)
+
+
+def test_only_offered_suggestions_are_learned(vocabulary):
+    socket = connect()
+    socket.emit('accept_correction', {'suggestion': 'anything at all'})
+    assert "anything at all" not in vocabulary.terms
+
+    socket.emit('suggest_correction', {'word': 'parasetamol', 'context': 'took 500 mg'})
+    offered = [event for event in socket.get_received() if event['name'] == 'correction_suggestions']
+    assert offered[0]['args'][0]['suggestions'][0] == "paracetamol"
+    for _ in range(2):
+        socket.emit('accept_correction', {'suggestion': 'paracetamol'})
+    assert vocabulary.terms["paracetamol"]["accepted"] == 1
+
+    # Offers belong to the socket they were sent to.
+    other = connect()
+    other.emit('accept_correction', {'suggestion': 'paracetamol'})
+    assert vocabulary.terms["paracetamol"]["accepted"] == 1
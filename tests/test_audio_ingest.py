@@ -0,0 +1,58 @@
+import numpy as np
+
+from audio_ingest import AudioRingBuffer, AudioStream, TARGET_RATE
+
+
+class Collector:
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def stream(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+def received(sample_rate, channels, sample_format, samples):
+    transcriber = Collector()
+    stream = AudioStream(transcriber, sample_rate, channels=channels, sample_format=sample_format, send_ms=10)
+    stream.feed(samples.tobytes())
+    stream.close()
+    assert transcriber.closed
+    return np.frombuffer(transcriber.data, dtype=np.int16)
+
+
+def tone(sample_rate, seconds=0.1, amplitude=0.25):
+    return amplitude * np.sin(2 * np.pi * 440 * np.arange(int(sample_rate * seconds)) / sample_rate)
+
+
+def test_stereo_s16_at_target_rate_is_not_clipped():
+    mono = (tone(TARGET_RATE) * 32767).astype(np.int16)
+    stereo = np.repeat(mono, 2)
+    out = received(TARGET_RATE, 2, "s16", stereo)
+    assert len(out) == len(mono)
+    assert np.abs(out.astype(int) - mono).max() <= 1
+
+
+def test_stereo_s16_resampled_keeps_level():
+    mono = (tone(48_000) * 32767).astype(np.int16)
+    out = received(48_000, 2, "s16", np.repeat(mono, 2))
+    assert abs(len(out) - len(mono) // 3) <= 1
+    assert 0.2 * 32767 < np.abs(out).max() < 0.3 * 32767
+
+
+def test_stereo_f32_downmix_averages_channels():
+    left = tone(TARGET_RATE).astype(np.float32)
+    stereo = np.column_stack((left, np.zeros_like(left))).ravel()
+    out = received(TARGET_RATE, 2, "f32", stereo)
+    assert np.abs(out.astype(int) - (left / 2 * 32767).astype(np.int16)).max() <= 1
+
+
+def test_ring_buffer_drops_oldest():
+    buffer = AudioRingBuffer(4)
+    buffer.write(np.arange(3, dtype=np.int16))
+    buffer.write(np.arange(3, 6, dtype=np.int16))
+    assert buffer.dropped == 2
+    assert np.frombuffer(buffer.read(4), dtype=np.int16).tolist() == [2, 3, 4, 5]
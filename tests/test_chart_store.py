@@ -0,0 +1,52 @@
+from chart_store import ChartStore
+
+PAYLOAD = {
+    "symptom_counts": {"fever": 2, "cough": 1},
+    "severity_trends": [{"time": "10:00:00", "severity": "LOW"}, {"time": "10:05:00", "severity": "HIGH"}],
+    "symptom_timeline": [{"time": "10:00:00", "symptom": "fever"}, {"time": "10:05:00", "symptom": "cough"}],
+}
+
+
+def test_live_merges_accumulate():
+    charts = ChartStore()
+    charts.merge(PAYLOAD)
+    charts.merge({"symptom_counts": {"fever": 1}, "severity_trends": [{"time": "10:10:00", "severity": "moderate"}]})
+    data = charts.delta()
+    assert data["symptom_counts"] == {"fever": 3, "cough": 1}
+    assert [point["severity"] for point in data["severity_trends"]] == ["LOW", "HIGH", "MODERATE"]
+
+
+def test_reanalysis_replaces_series_instead_of_duplicating():
+    charts = ChartStore()
+    charts.merge(PAYLOAD)
+    version = charts.version
+    charts.merge(PAYLOAD, replace=True)
+    charts.merge(PAYLOAD, replace=True)
+    data = charts.delta()
+    assert len(data["severity_trends"]) == 2
+    assert len(data["symptom_timeline"]) == 2
+    assert data["symptom_counts"] == {"fever": 2, "cough": 1}
+    # An unchanged re-analysis does not force clients to start over.
+    assert charts.version == version
+
+
+def test_changed_reanalysis_resets_clients():
+    charts = ChartStore()
+    charts.merge(PAYLOAD)
+    since = charts.version
+    charts.merge({"severity_trends": [{"time": "10:00:00", "severity": "LOW"}]}, replace=True)
+    data = charts.delta(since)
+    assert data["reset"]
+    assert data["severity_trends"] == [{"time": "10:00:00", "severity": "LOW"}]
+    # Series the extraction did not include are left alone.
+    assert len(data["symptom_timeline"]) == 2
+
+
+def test_round_trip_keeps_reset_version():
+    charts = ChartStore(capacity=8)
+    charts.merge(PAYLOAD)
+    since = charts.version
+    charts.merge({"symptom_timeline": []}, replace=True)
+    restored = ChartStore.from_dict(charts.to_dict())
+    assert restored.delta(since)["reset"]
+    assert restored.delta(restored.version) == charts.delta(charts.version)
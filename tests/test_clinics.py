@@ -0,0 +1,36 @@
+import pytest
+
+from clinics import ClinicDirectory, geohash, geohash_center, specialty_for
+
+
+@pytest.mark.parametrize("diagnosis, specialty", [
+    ("Fever of unclear etiology", "general"),
+    ("Linear IgA disease", "general"),
+    ("Tear in the rotator cuff", "general"),
+    ("Ear infection", "ent"),
+    ("Acute otitis media, left ear.", "ent"),
+    ("Hypothyroidism", "endocrinology"),
+    ("Infective endocarditis", "cardiology"),
+    ("Community-acquired pneumonia", "pulmonology"),
+    ("Osteoarthritis of the knee", "orthopedics"),
+    ("Pyelonephritis", "nephrology"),
+    (None, "general"),
+])
+def test_specialty_for_matches_whole_word_starts(diagnosis, specialty):
+    assert specialty_for(diagnosis) == specialty
+
+
+def test_geohash_center_is_inside_its_cell():
+    cell = geohash(12.9716, 77.5946)
+    assert geohash(*geohash_center(cell)) == cell
+
+
+def test_nearest_tops_up_with_general_practice():
+    clinics = [
+        {"name": "Heart Centre", "address": "", "phone": "", "latitude": 12.97, "longitude": 77.59, "specialties": {"cardiology"}},
+        {"name": "Corner GP", "address": "", "phone": "", "latitude": 12.98, "longitude": 77.60, "specialties": {"general"}},
+        {"name": "Far GP", "address": "", "phone": "", "latitude": 28.61, "longitude": 77.21, "specialties": {"general"}},
+    ]
+    directory = ClinicDirectory(clinics, k=3, max_km=50)
+    found = [clinic["name"] for clinic, _ in directory.nearest(12.97, 77.59, "cardiology")]
+    assert found == ["Heart Centre", "Corner GP"]
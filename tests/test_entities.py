@@ -0,0 +1,29 @@
+from entities import EntityIndex, _EntityParser, parse_entities
+
+
+def test_br_joined_segments_do_not_stay_open():
+    html = "<br>".join(f'seg {i} <span style="color: red;">Name{i}</span>' for i in range(3000))
+    parser = _EntityParser()
+    found = parser.parse(html)
+    # Void elements are never pushed, so text is not appended to them and
+    # nothing is left open at the end.
+    assert parser.stack == []
+    assert parser.collecting == []
+    assert len(found) == 3000
+    assert found[1] == ("phi", "Name1", html.index("<span", html.index("seg 1")))
+
+
+def test_text_after_br_belongs_to_enclosing_span():
+    html = '<span style="color: red;">Jane<br/> Doe</span><br>age <em>arm</em>'
+    assert parse_entities(html) == [("phi", "Jane Doe", 0), ("anatomy", "arm", html.index("<em>"))]
+
+
+def test_nested_categories_and_unmatched_end_tags():
+    found = parse_entities('<span class="severity">Severity: <span style="color:blue">LOW</span></span></p>')
+    assert [(category, text) for category, text, _ in found] == [("severity", "Severity: LOW"), ("diagnosis", "LOW")]
+
+
+def test_index_reuses_parsed_entities():
+    index = EntityIndex()
+    index.add("<em>ignored</em>", [("anatomy", "knee", 3)])
+    assert index.texts("anatomy") == ["knee"]
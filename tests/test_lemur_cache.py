@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+
+import pytest
+
+import lemur_cache
+from lemur_cache import LemurCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lemur_cache, "time", clock)
+    return clock
+
+
+def counting(value):
+    calls = []
+
+    def compute():
+        calls.append(value)
+        return value
+    return compute, calls
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = LemurCache(ttl=10)
+    compute, calls = counting("answer")
+    assert cache.get_or_compute("k", compute) == "answer"
+    clock.now += 9
+    assert cache.get_or_compute("k", compute) == "answer"
+    clock.now += 2
+    assert cache.get_or_compute("k", compute) == "answer"
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_zero_skips_the_cache():
+    cache = LemurCache()
+    compute, calls = counting("answer")
+    cache.get_or_compute("k", compute, ttl=0)
+    cache.get_or_compute("k", compute, ttl=0)
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LemurCache(max_entries=2)
+    cache.get_or_compute("a", lambda: "A")
+    cache.get_or_compute("b", lambda: "B")
+    cache.get_or_compute("a", lambda: "stale")
+    cache.get_or_compute("c", lambda: "C")
+    assert list(cache.entries) == ["a", "c"]
+
+
+def wait_for_waiter(cache):
+    for _ in range(500):
+        if cache.stats()["coalesced"]:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("second request never waited")
+
+
+def test_concurrent_identical_requests_share_one_computation():
+    cache = LemurCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow)))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow)))
+    waiter.start()
+    wait_for_waiter(cache)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert results == ["answer", "answer"]
+    assert len(calls) == 1
+    assert cache.stats()["inflight"] == 0
+
+
+def test_failure_is_raised_in_waiters_and_not_cached():
+    cache = LemurCache()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("LeMUR is down")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute("k", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    owner = threading.Thread(target=call)
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    wait_for_waiter(cache)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert errors == ["LeMUR is down", "LeMUR is down"]
+    assert cache.get_or_compute("k", lambda: "recovered") == "recovered"
+
+
+def test_answers_are_read_back_from_disk_after_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    LemurCache(path=path).get_or_compute("k", lambda: "answer")
+    restarted = LemurCache(path=path)
+    compute, calls = counting("recomputed")
+    assert restarted.get_or_compute("k", compute) == "answer"
+    assert calls == []
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_is_purged_and_capped(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = LemurCache(path=path, ttl=10, max_disk_entries=2, purge_every=1)
+    for key in "abc":
+        clock.now += 1
+        cache.get_or_compute(key, lambda: key.upper())
+    rows = sqlite3.connect(path).execute("SELECT key FROM lemur_cache ORDER BY key").fetchall()
+    assert rows == [("b",), ("c",)]
+    clock.now += 100
+    LemurCache(path=path)
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM lemur_cache").fetchone() == (0,)
+
+
+def test_memory_hits_do_not_wait_for_disk_io(tmp_path):
+    cache = LemurCache(path=str(tmp_path / "cache.sqlite"))
+    cache.get_or_compute("k", lambda: "answer")
+    results = []
+    with cache.db_lock:
+        reader = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", lambda: "recomputed")))
+        reader.start()
+        reader.join(2)
+    assert results == ["answer"]
@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pipeline
+from pipeline import Stage, run_stages
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.fixture
+def timings(monkeypatch):
+    timings = []
+    monkeypatch.setattr(pipeline, "timing_hooks", [lambda name, seconds, status: timings.append((name, status))])
+    return timings
+
+
+def test_stages_receive_their_dependencies_results(pool):
+    results = run_stages([
+        Stage("a", lambda inputs: 1),
+        Stage("b", lambda inputs: 2),
+        Stage("sum", lambda inputs: inputs["a"] + inputs["b"], deps=("a", "b")),
+        Stage("double", lambda inputs: inputs["sum"] * 2, deps=("sum",)),
+    ], pool)
+    assert results == {"a": 1, "b": 2, "sum": 3, "double": 6}
+
+
+def test_none_results_and_failures_skip_dependents(pool, timings):
+    calls = []
+
+    def failing(inputs):
+        raise RuntimeError("boom")
+
+    results = run_stages([
+        Stage("empty", lambda inputs: None),
+        Stage("after_empty", lambda inputs: calls.append("after_empty"), deps=("empty",)),
+        Stage("then", lambda inputs: calls.append("then"), deps=("after_empty",)),
+        Stage("failing", failing),
+        Stage("after_failing", lambda inputs: calls.append("after_failing"), deps=("failing",)),
+        Stage("independent", lambda inputs: "ok"),
+    ], pool)
+    assert calls == []
+    assert results["after_empty"] is None and results["then"] is None
+    assert results["failing"] is None and results["after_failing"] is None
+    assert results["independent"] == "ok"
+    assert ("failing", "failed") in timings
+    assert not any(name.startswith("after") or name == "then" for name, _ in timings)
+
+
+def test_slow_stage_times_out_and_skips_dependents(pool, timings):
+    release = threading.Event()
+    started = time.monotonic()
+    results = run_stages([
+        Stage("slow", lambda inputs: release.wait(5) and "late", timeout=0.2),
+        Stage("after", lambda inputs: "never", deps=("slow",)),
+    ], pool)
+    release.set()
+    assert time.monotonic() - started < 2
+    assert results == {"slow": None, "after": None}
+    assert timings == [("slow", "timeout")]
+
+
+def test_timeout_counts_from_when_a_stage_starts_running(timings):
+    # With one worker, "queued" waits behind "busy" for longer than its own
+    # timeout, but runs well within it once started.
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        results = run_stages([
+            Stage("busy", lambda inputs: time.sleep(0.4) or "done"),
+            Stage("queued", lambda inputs: "ran", timeout=0.2),
+        ], pool)
+    finally:
+        pool.shutdown(wait=True)
+    assert results == {"busy": "done", "queued": "ran"}
+    assert ("queued", "ok") in timings
+
+
+def test_on_result_runs_on_the_caller_in_completion_order(pool):
+    seen = []
+    caller = threading.get_ident()
+
+    def record(name):
+        return lambda result: seen.append((name, result, threading.get_ident() == caller))
+
+    run_stages([
+        Stage("slow", lambda inputs: time.sleep(0.2) or "s", on_result=record("slow")),
+        Stage("fast", lambda inputs: "f", on_result=record("fast")),
+        Stage("empty", lambda inputs: None, on_result=record("empty")),
+        Stage("last", lambda inputs: "l", deps=("slow", "fast"), on_result=record("last")),
+    ], pool)
+    assert seen == [("fast", "f", True), ("slow", "s", True), ("last", "l", True)]
+
+
+def test_failing_callback_does_not_stop_the_run(pool):
+    def broken(result):
+        raise RuntimeError("callback")
+
+    results = run_stages([
+        Stage("a", lambda inputs: 1, on_result=broken),
+        Stage("b", lambda inputs: inputs["a"] + 1, deps=("a",)),
+    ], pool)
+    assert results == {"a": 1, "b": 2}
+
+
+def test_dependencies_must_be_declared_first(pool):
+    with pytest.raises(ValueError):
+        run_stages([Stage("b", lambda inputs: 1, deps=("a",)), Stage("a", lambda inputs: 1)], pool)
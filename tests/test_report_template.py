@@ -0,0 +1,27 @@
+import re
+
+import app
+from pdf_renderer import READY_FLAG
+from sessions import Consultation
+
+ES2015_SYNTAX = re.compile(r"=>|`|\b(?:let|const|class)\s")
+
+
+def render(pdf_mode):
+    consultation = Consultation("test")
+    with app.app.test_request_context('/'):
+        return app.render_report(consultation, pdf_mode=pdf_mode, chart_data=app.chart_payload(consultation), base_url="/")
+
+
+def test_pdf_mode_sets_ready_flag_from_an_es5_script():
+    html = render(pdf_mode=True)
+    scripts = re.findall(r"<script>(.*?)</script>", html, re.S)
+    flagging = [script for script in scripts if READY_FLAG in script]
+    # wkhtmltopdf's QtWebKit cannot parse ES2015, so the only script that sets
+    # the flag must not use it.
+    assert len(flagging) == 1
+    assert not ES2015_SYNTAX.search(re.sub(r"//.*", "", flagging[0]))
+
+
+def test_browser_mode_does_not_set_ready_flag():
+    assert READY_FLAG not in render(pdf_mode=False)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import scheduler
+from scheduler import AnalysisScheduler
+
+
+class Handler:
+    # Records each call and blocks until released, so tests decide exactly
+    # when jobs finish.
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.release = threading.Event()
+        self.fail_on = set(fail_on)
+        self.lock = threading.Lock()
+
+    def __call__(self, consultation_id, text, traces=None):
+        with self.lock:
+            self.calls.append((consultation_id, text, list(traces)))
+        self.release.wait(5)
+        if text in self.fail_on:
+            raise RuntimeError(text)
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.005)
+
+
+def drain(jobs, handler, count):
+    handler.release.set()
+    wait_until(lambda: jobs.stats()["processed"] == count)
+
+
+def test_utterances_are_merged_into_a_queued_job():
+    handler = Handler()
+    jobs = AnalysisScheduler(handler, workers=1)
+    jobs.submit("a", "one", trace="t1")
+    wait_until(lambda: handler.calls)
+    jobs.submit("a", "two", trace="t2")
+    jobs.submit("a", "three", trace="t3")
+    drain(jobs, handler, 2)
+    assert handler.calls == [("a", "one", ["t1"]), ("a", "two three", ["t2", "t3"])]
+    assert jobs.stats()["merged"] == 1
+
+
+def test_job_that_waited_max_latency_is_not_merged_into(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(scheduler, "time", type("Clock", (), {"monotonic": staticmethod(lambda: now[0])}))
+    handler = Handler()
+    jobs = AnalysisScheduler(handler, workers=1, max_latency=2.0)
+    jobs.submit("a", "one")
+    wait_until(lambda: handler.calls)
+    jobs.submit("a", "two")
+    now[0] += 1
+    jobs.submit("a", "three")
+    now[0] += 2
+    jobs.submit("a", "four")
+    drain(jobs, handler, 3)
+    assert [text for _, text, _ in handler.calls] == ["one", "two three", "four"]
+
+
+def test_one_job_per_consultation_runs_at_a_time():
+    handler = Handler()
+    jobs = AnalysisScheduler(handler, workers=2)
+    jobs.submit("a", "a1")
+    wait_until(lambda: len(handler.calls) == 1)
+    jobs.submit("a", "a2")
+    jobs.submit("b", "b1")
+    # The second worker skips a2, which waits for a1, and takes b1.
+    wait_until(lambda: len(handler.calls) == 2)
+    assert handler.calls[1][1] == "b1"
+    assert jobs.stats()["queue_depth"] == 1
+    drain(jobs, handler, 3)
+    assert [text for _, text, _ in handler.calls] == ["a1", "b1", "a2"]
+
+
+def test_full_queue_merges_or_drops():
+    handler = Handler()
+    jobs = AnalysisScheduler(handler, workers=1, max_queue=1, max_latency=0, put_timeout=0)
+    jobs.submit("a", "a1")
+    wait_until(lambda: handler.calls)
+    assert jobs.submit("b", "b1")
+    # Queue full: b's queued job takes the utterance despite max_latency,
+    # and a consultation with nothing queued loses it.
+    assert jobs.submit("b", "b2")
+    assert not jobs.submit("c", "c1")
+    drain(jobs, handler, 2)
+    assert [text for _, text, _ in handler.calls] == ["a1", "b1 b2"]
+
+
+def test_stats_count_every_outcome():
+    handler = Handler(fail_on={"a1"})
+    jobs = AnalysisScheduler(handler, workers=1, max_queue=1, put_timeout=0)
+    jobs.submit("a", "a1")
+    wait_until(lambda: handler.calls)
+    jobs.submit("b", "b1")
+    jobs.submit("b", "b2")
+    jobs.submit("c", "c1")
+    running = jobs.stats()
+    assert (running["running"], running["queue_depth"]) == (1, 1)
+    drain(jobs, handler, 2)
+    stats = jobs.stats()
+    assert {key: stats[key] for key in ("submitted", "merged", "dropped", "processed", "failed", "running", "queue_depth")} == {
+        "submitted": 4, "merged": 1, "dropped": 1, "processed": 2, "failed": 1, "running": 0, "queue_depth": 0,
+    }
+    assert stats["wait_seconds_max"] >= stats["wait_seconds_avg"] >= 0
@@ -0,0 +1,60 @@
+from segments import Segment, SegmentStore, split_sentences
+
+
+def store(*texts):
+    segments = SegmentStore()
+    for text in texts:
+        segments.append(Segment(text, f"<p>{text}</p>", entities=[]))
+    return segments
+
+
+def describe(parts):
+    # Reused segments by their text, runs to format as ("new", text).
+    return [part.text if isinstance(part, Segment) else ("new", part) for part in parts]
+
+
+def test_split_sentences():
+    assert split_sentences("I have a cough.  Since Monday!\nNo fever?") == ["I have a cough.", "Since Monday!", "No fever?"]
+
+
+def test_unchanged_text_reuses_every_segment():
+    segments = store("I have a cough.", "It started Monday. No fever.")
+    parts = segments.plan("I have a cough.\nIt started   Monday.  no fever.")
+    assert describe(parts) == ["I have a cough.", "It started Monday. No fever."]
+    assert all(part is segment for part, segment in zip(parts, segments.segments))
+
+
+def test_single_edited_sentence_is_the_only_run():
+    segments = store("I have a cough.", "It started Monday.", "No fever.")
+    parts = segments.plan("I have a cough. It started Tuesday. No fever.")
+    assert describe(parts) == ["I have a cough.", ("new", "It started Tuesday."), "No fever."]
+
+
+def test_inserted_and_deleted_sentences():
+    segments = store("I have a cough.", "It started Monday.", "No fever.")
+    inserted = segments.plan("I have a cough. It is dry. Very dry. It started Monday. No fever.")
+    assert describe(inserted) == ["I have a cough.", ("new", "It is dry. Very dry."), "It started Monday.", "No fever."]
+    deleted = segments.plan("I have a cough. No fever.")
+    assert describe(deleted) == ["I have a cough.", "No fever."]
+    appended = segments.plan("I have a cough. It started Monday. No fever. Some nausea.")
+    assert describe(appended)[-1] == ("new", "Some nausea.")
+
+
+def test_partly_matched_segment_is_reformatted_whole():
+    # One edited sentence in a two-sentence segment re-formats both, since
+    # a segment's formatted HTML cannot be split.
+    segments = store("I have a cough.", "It started Monday. No fever.", "Some nausea.")
+    parts = segments.plan("I have a cough. It started Monday. High fever. Some nausea.")
+    assert describe(parts) == ["I have a cough.", ("new", "It started Monday. High fever."), "Some nausea."]
+
+
+def test_reordered_segments_are_reused_where_they_now_appear():
+    segments = store("I have a cough.", "No fever.")
+    assert describe(segments.plan("No fever. I have a cough.")) == [("new", "No fever."), "I have a cough."]
+
+
+def test_replace_swaps_in_the_new_segments():
+    segments = store("I have a cough.")
+    new = [Segment("No fever.", "<p>No fever.</p>", entities=[])]
+    segments.replace(new)
+    assert [segment.text for segment in segments.segments] == ["No fever."]
@@ -0,0 +1,47 @@
+import threading
+
+from sessions import MemoryBackend, SessionStore
+
+
+def test_analysis_works_on_a_private_copy():
+    store = SessionStore(MemoryBackend())
+    with store.edit("c1") as consultation:
+        consultation.charts.add_counts({"fever": 1})
+    with store.analysis("c1") as analyzed:
+        assert analyzed is not store.get("c1")
+        analyzed.charts.add_counts({"fever": 2})
+        analyzed.report_transcript = "half done"
+        assert store.get("c1").charts.symptom_counts == {"fever": 1}
+        assert store.get("c1").report_transcript == ""
+    assert store.get("c1").charts.symptom_counts == {"fever": 3}
+    assert store.get("c1").report_transcript == "half done"
+
+
+def test_edits_during_an_analysis_are_kept_and_not_blocked():
+    store = SessionStore(MemoryBackend())
+    started, finish = threading.Event(), threading.Event()
+
+    def analyze():
+        with store.analysis("c1") as analyzed:
+            started.set()
+            finish.wait(5)
+            analyzed.report_transcript = "report"
+
+    thread = threading.Thread(target=analyze)
+    thread.start()
+    assert started.wait(5)
+    with store.edit("c1") as consultation:
+        consultation.user_location = {"latitude": 1, "longitude": 2}
+    finish.set()
+    thread.join(5)
+    consultation = store.get("c1")
+    assert consultation.user_location == {"latitude": 1, "longitude": 2}
+    assert consultation.report_transcript == "report"
+
+
+def test_memory_backend_expires_consultations():
+    backend = MemoryBackend(ttl=0)
+    store = SessionStore(backend)
+    with store.edit("c1") as consultation:
+        consultation.report_transcript = "x"
+    assert store.get("c1").report_transcript == ""
@@ -0,0 +1,40 @@
+import csv
+
+from vocabulary import MedicalVocabulary, metaphone, soundex
+
+
+def rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_phonetic_keys_match_common_mishearings():
+    assert metaphone("farmacy") == metaphone("pharmacy")
+    assert soundex("Robert") == soundex("Rupert") == "R163"
+
+
+def test_suggest_ranks_close_terms_first(tmp_path):
+    terms = tmp_path / "terms.csv"
+    terms.write_text("term,category\nparacetamol,medication\nparacentesis,test\n", encoding="utf-8")
+    vocabulary = MedicalVocabulary(str(terms))
+    assert vocabulary.suggest("parasetamol", "took 500 mg")[0][0] == "paracetamol"
+
+
+def test_learned_terms_keep_one_row_with_a_count(tmp_path):
+    learned = tmp_path / "learned.csv"
+    vocabulary = MedicalVocabulary(learned_path=str(learned))
+    for _ in range(3):
+        assert vocabulary.learn("Mounjaro")
+    assert not vocabulary.learn("x")
+    assert rows(learned) == [{"term": "mounjaro", "category": "learned", "accepted": "3"}]
+    reloaded = MedicalVocabulary(learned_path=str(learned))
+    assert reloaded.terms["mounjaro"]["accepted"] == 3
+
+
+def test_learned_file_with_one_row_per_accept_still_loads(tmp_path):
+    learned = tmp_path / "learned.csv"
+    learned.write_text("term,category\nmounjaro,learned\nmounjaro,learned\n", encoding="utf-8")
+    vocabulary = MedicalVocabulary(learned_path=str(learned))
+    assert vocabulary.terms["mounjaro"]["accepted"] == 2
+    vocabulary.learn("mounjaro")
+    assert rows(learned) == [{"term": "mounjaro", "category": "learned", "accepted": "3"}]
@@ -0,0 +1,218 @@
+import csv
+import os
+import re
+import threading
+from collections import Counter
+
+# Words in the surrounding transcript that make a category more likely.
+CONTEXT_HINTS = {
+    "medication": {"mg", "ml", "tablet", "tablets", "capsule", "dose", "prescribed", "prescribe", "taking", "took",
+                   "take", "pill", "pills", "syrup", "injection", "daily", "twice"},
+    "symptom": {"feel", "feeling", "felt", "having", "suffering", "complains", "complaining", "since", "worse"},
+    "condition": {"diagnosed", "diagnosis", "history", "suspect", "suspected", "chronic", "known", "case"},
+    "anatomy": {"left", "right", "upper", "lower", "swollen", "swelling", "side", "hurts", "injured"},
+    "test": {"test", "tests", "scan", "report", "result", "results", "ordered", "level", "levels", "check"},
+}
+
+SOUNDEX_CODES = {letter: code for letters, code in (
+    ("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6")
+) for letter in letters}
+
+# A reduced Metaphone: enough for the usual mishearings (ph/f, c/k/s, x/ks,
+# silent initial letters) to produce the same key. "ch" before a consonant
+# is the Greek k of chlor-, chron- and friends.
+PHONETIC_RULES = [
+    (re.compile(r'^(kn|gn|pn|ps|wr)'), lambda m: m.group(1)[1]),
+    (re.compile(r'^x'), 's'),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ch(?=[^aeiouy]|$)'), 'k'),
+    (re.compile(r'tch|ch|sh'), 'x'),
+    (re.compile(r'th'), '0'),
+    (re.compile(r'ck|q'), 'k'),
+    (re.compile(r'dg'), 'j'),
+    (re.compile(r'c(?=[eiy])'), 's'),
+    (re.compile(r'c'), 'k'),
+    (re.compile(r'g(?=[eiy])'), 'j'),
+    (re.compile(r'gh'), 'g'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'v'), 'f'),
+]
+
+LEARNABLE = re.compile(r"^[a-z0-9][a-z0-9 '\-]{1,63}$")
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9 '\-]", " ", text.lower()).split())
+
+
+def letters(text):
+    return re.sub(r'[^a-z]', '', text.lower())
+
+
+def collapse(text):
+    return re.sub(r'(.)\1+', r'\1', text)
+
+
+def soundex(text):
+    word = letters(text)
+    if not word:
+        return ""
+    codes = [SOUNDEX_CODES.get(letter, "") for letter in word]
+    key = word[0].upper()
+    previous = codes[0]
+    for letter, code in zip(word[1:], codes[1:]):
+        if code and code != previous:
+            key += code
+        # h and w do not separate letters with the same code; vowels do.
+        if letter not in "hw":
+            previous = code
+    return (key + "000")[:4]
+
+
+def metaphone(text):
+    word = letters(text)
+    if not word:
+        return ""
+    for pattern, replacement in PHONETIC_RULES:
+        word = pattern.sub(replacement, word)
+    first = "a" if word[0] in "aeiouy" else word[0]
+    return collapse(first + re.sub(r'[aeiouyhw]', '', word[1:]))
+
+
+def trigrams(text):
+    padded = f"${letters(text)}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+class MedicalVocabulary:
+    # Medical terms indexed by Metaphone and Soundex keys and by character
+    # trigrams. suggest() ranks the candidates these produce by spelling,
+    # sound and trigram overlap, and breaks near-ties with the transcript
+    # context and with how often a term has been accepted before. Accepted
+    # terms and their counts are kept in learned_path, if given (one row per
+    # term, rewritten on every accept), and reloaded on startup.
+    def __init__(self, path=None, learned_path=None, max_candidates=50):
+        self.learned_path = learned_path
+        self.max_candidates = max_candidates
+        self.lock = threading.Lock()
+        self.terms = {}  # normalized term -> {"term", "category", "accepted", and its keys}
+        self.by_metaphone = {}
+        self.by_soundex = {}
+        self.by_gram = {}
+        for source, learned in ((path, False), (learned_path, True)):
+            if not source:
+                continue
+            try:
+                with open(source, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        entry = self.add(row["term"], row.get("category") or "learned")
+                        if learned and entry:
+                            # Files written before counts were kept have one row per accept.
+                            entry["accepted"] += int(row.get("accepted") or 1)
+            except FileNotFoundError:
+                if not learned:
+                    raise
+
+    def add(self, term, category):
+        key = normalize(term)
+        if not key:
+            return None
+        with self.lock:
+            entry = self.terms.get(key)
+            if entry is None:
+                entry = self.terms[key] = {
+                    "term": key,
+                    "category": category,
+                    "accepted": 0,
+                    "letters": letters(key),
+                    "metaphone": metaphone(key),
+                    "soundex": soundex(key),
+                    "trigrams": trigrams(key),
+                }
+                self.by_metaphone.setdefault(entry["metaphone"], set()).add(key)
+                self.by_soundex.setdefault(entry["soundex"], set()).add(key)
+                for gram in entry["trigrams"]:
+                    self.by_gram.setdefault(gram, set()).add(key)
+            return entry
+
+    def learn(self, term, category="learned"):
+        key = normalize(term)
+        if not LEARNABLE.match(key):
+            return False
+        entry = self.add(key, category)
+        with self.lock:
+            entry["accepted"] += 1
+            if self.learned_path:
+                self._save_learned()
+        return True
+
+    def _save_learned(self):
+        # Written to a temporary file and renamed, so a crash mid-write keeps
+        # the previous counts.
+        temporary = f"{self.learned_path}.tmp"
+        with open(temporary, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["term", "category", "accepted"])
+            for entry in self.terms.values():
+                if entry["accepted"]:
+                    writer.writerow([entry["term"], entry["category"], entry["accepted"]])
+        os.replace(temporary, self.learned_path)
+
+    def _candidates(self, sound, sound_code, grams):
+        with self.lock:
+            candidates = set(self.by_metaphone.get(sound, ())) | self.by_soundex.get(sound_code, set())
+            overlap = Counter()
+            for gram in grams:
+                overlap.update(self.by_gram.get(gram, ()))
+            candidates.update(term for term, _ in overlap.most_common(self.max_candidates))
+            return [self.terms[term] for term in candidates]
+
+    def suggest(self, word, context="", limit=3):
+        # Returns up to limit (term, score) pairs, best first; scores are in 0..1.
+        word = normalize(word)
+        spelled = letters(word)
+        if not spelled:
+            return []
+        sound = metaphone(word)
+        sound_code = soundex(word)
+        grams = trigrams(word)
+        context_words = set(normalize(context).split())
+        hinted = {category for category, hints in CONTEXT_HINTS.items() if hints & context_words}
+        context_text = f" {normalize(context)} "
+
+        scored = []
+        for entry in self._candidates(sound, sound_code, grams):
+            term = entry["term"]
+            spelling = 1 - edit_distance(spelled, entry["letters"]) / max(len(spelled), len(entry["letters"]))
+            if entry["metaphone"] == sound:
+                similar_sound = 1.0
+            elif len(sound) > 2 and edit_distance(entry["metaphone"], sound) <= 1:
+                similar_sound = 0.7
+            elif entry["soundex"] == sound_code:
+                similar_sound = 0.5
+            else:
+                similar_sound = 0.0
+            overlap = len(grams & entry["trigrams"]) / len(grams | entry["trigrams"])
+            score = 0.4 * spelling + 0.35 * similar_sound + 0.25 * overlap
+            # Context only ever breaks near-ties: at most +0.1 in total.
+            if entry["category"] in hinted:
+                score += 0.04
+            if f" {term} " in context_text and term != word:
+                score += 0.03
+            score += min(0.03, 0.01 * entry["accepted"])
+            scored.append((round(min(score, 1.0), 3), term))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(term, score) for score, term in scored[:limit]]